@@ -51,15 +51,18 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'supplies',
     'requisitions',
+    'core',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'core.ratelimit.RateLimitMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -94,6 +97,35 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'dilg-inventory'),
+    }
+}
+
+
+# Background tasks
+# https://docs.djangoproject.com/en/6.0/topics/tasks/
+# Tasks are stored in the database and executed by `manage.py run_worker`;
+# failed tasks are retried up to MAX_ATTEMPTS times with exponential backoff
+# starting at RETRY_DELAY seconds.
+
+TASKS = {
+    'default': {
+        'BACKEND': 'core.backends.DatabaseBackend',
+        'QUEUES': ['default'],
+        'OPTIONS': {
+            'MAX_ATTEMPTS': int(os.environ.get('TASK_MAX_ATTEMPTS', 3)),
+            'RETRY_DELAY': float(os.environ.get('TASK_RETRY_DELAY', 30)),
+        },
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -132,9 +164,48 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# collectstatic writes content-hashed copies plus .gz (and .br when Brotli is
+# installed) variants; WhiteNoise serves the precompressed file and marks
+# hashed names as immutable with a far-future max-age.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Rendered receipts of approved requests, which never change once decided
+RECEIPT_CACHE_ROOT = Path(os.environ.get('RECEIPT_CACHE_ROOT', BASE_DIR / 'receipt_cache'))
+
+# Decided requests older than this move from the live request tables into
+# the compact archive table (`manage.py archive_requests`)
+REQUEST_ARCHIVE_AFTER_DAYS = int(os.environ.get('REQUEST_ARCHIVE_AFTER_DAYS', 365))
+
+# How long a submitted form token keeps replaying its first outcome
+# (`manage.py purge_idempotency_keys` deletes expired ones)
+IDEMPOTENCY_KEY_TTL_HOURS = int(os.environ.get('IDEMPOTENCY_KEY_TTL_HOURS', 24))
+
+# Retired supplies with no deliveries, requests or counts are deleted after this long
+# (`manage.py purge_retired_supplies`); supplies with history are never deleted
+SUPPLY_PURGE_AFTER_DAYS = int(os.environ.get('SUPPLY_PURGE_AFTER_DAYS', 90))
+
+# Token-bucket limits on POSTs per URL name, kept in the default cache. A rate of
+# '10/m' allows bursts of 10 and refills 10 tokens a minute. 'ip' buckets are per
+# client address, 'user' buckets per signed-in user; shed requests get a 429.
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', '1') == '1'
+RATE_LIMITS = {
+    'signup_requestor': {'ip': '5/h'},
+    'login': {'ip': '20/m'},
+    'request_create': {'ip': '30/m', 'user': '10/m'},
+}
+# Set to e.g. HTTP_X_FORWARDED_FOR when running behind a reverse proxy
+RATE_LIMIT_CLIENT_IP_HEADER = os.environ.get('RATE_LIMIT_CLIENT_IP_HEADER', '')
+
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/accounts/login/'
 
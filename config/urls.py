@@ -26,5 +26,6 @@ urlpatterns = [
     path('accounts/signup/', supply_views.signup_requestor, name='signup_requestor'),
     path('supplies/', include('supplies.urls')),
     path('requests/', include('requisitions.urls')),
+    path('ops/', include('core.urls')),
     path('', RedirectView.as_view(pattern_name='home', permanent=False)),
 ]
@@ -0,0 +1,76 @@
+from django.tasks import TaskResult, TaskResultStatus
+from django.tasks.backends.base import BaseTaskBackend
+from django.tasks.base import TaskError
+from django.tasks.exceptions import TaskResultDoesNotExist
+from django.tasks.signals import task_enqueued
+from django.utils.crypto import get_random_string
+from django.utils.module_loading import import_string
+
+
+# Stores tasks as core.TaskRecord rows; `manage.py run_worker` executes them.
+# Enqueueing inside a transaction is atomic with it, so workers never see a task
+# whose triggering write was rolled back.
+class DatabaseBackend(BaseTaskBackend):
+	supports_defer = True
+	supports_async_task = True
+	supports_get_result = True
+	supports_priority = True
+
+	def __init__(self, alias, params):
+		super().__init__(alias, params)
+		self.max_attempts = int(self.options.get('MAX_ATTEMPTS', 3))
+		self.retry_delay = float(self.options.get('RETRY_DELAY', 30))
+
+	def enqueue(self, task, args, kwargs):
+		from .models import TaskRecord
+
+		self.validate_task(task)
+		record = TaskRecord.objects.create(
+			id=get_random_string(32),
+			task_path=task.module_path,
+			backend=self.alias,
+			queue_name=task.queue_name,
+			priority=task.priority,
+			args=args,
+			kwargs=kwargs,
+			run_after=task.run_after,
+			max_attempts=self.max_attempts,
+		)
+		result = self.to_result(record, task)
+		task_enqueued.send(type(self), task_result=result)
+		return result
+
+	def get_result(self, result_id):
+		from .models import TaskRecord
+
+		try:
+			record = TaskRecord.objects.get(pk=result_id, backend=self.alias)
+		except TaskRecord.DoesNotExist:
+			raise TaskResultDoesNotExist(result_id) from None
+		return self.to_result(record)
+
+	def to_result(self, record, task=None):
+		if task is None:
+			task = import_string(record.task_path)
+		task = task.using(
+			priority=record.priority,
+			queue_name=record.queue_name,
+			run_after=record.run_after,
+			backend=self.alias,
+		)
+		result = TaskResult(
+			task=task,
+			id=record.id,
+			status=TaskResultStatus(record.status),
+			enqueued_at=record.enqueued_at,
+			started_at=record.started_at,
+			finished_at=record.finished_at,
+			last_attempted_at=record.last_attempted_at,
+			args=record.args,
+			kwargs=record.kwargs,
+			backend=self.alias,
+			errors=[TaskError(**error) for error in record.errors],
+			worker_ids=list(record.worker_ids),
+		)
+		object.__setattr__(result, '_return_value', record.return_value)
+		return result
@@ -0,0 +1,115 @@
+import time
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+from .models import IdempotencyKey
+
+
+IDEMPOTENCY_FIELD = 'idempotency_key'
+# A double click sends the second POST while the first is still running;
+# wait this long for its outcome before giving up
+REPLAY_WAIT_SECONDS = 5
+REPLAY_POLL_INTERVAL = 0.1
+
+
+def new_idempotency_key():
+	return get_random_string(32)
+
+
+def _key_ttl():
+	return timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS)
+
+
+def _claim(request, key, scope):
+	now = timezone.now()
+	lookup = {'user': request.user, 'scope': scope, 'key': key}
+	# An expired token behaves like a fresh one, even before the purge runs
+	IdempotencyKey.objects.filter(expires_at__lte=now, **lookup).delete()
+	try:
+		with transaction.atomic():
+			return IdempotencyKey.objects.create(expires_at=now + _key_ttl(), **lookup)
+	except IntegrityError:
+		return None
+
+
+def _replay(request, key, scope):
+	deadline = time.monotonic() + REPLAY_WAIT_SECONDS
+	while True:
+		record = IdempotencyKey.objects.filter(user=request.user, scope=scope, key=key).first()
+		if record is None or record.status_code is not None or time.monotonic() >= deadline:
+			break
+		time.sleep(REPLAY_POLL_INTERVAL)
+
+	if record is None or record.status_code is None:
+		# Still running (or it failed and released the token): don't run it twice
+		return HttpResponse(
+			'This form is still being processed. Check the result before submitting again.',
+			status=409,
+			content_type='text/plain; charset=utf-8',
+		)
+	# The first response's messages may still be pending if the browser dropped it
+	pending = _queued_messages(request)
+	for level, message in record.messages:
+		if [level, message] not in pending:
+			messages.add_message(request, level, message)
+	response = HttpResponse(status=record.status_code)
+	response['Location'] = record.location
+	response['Idempotent-Replayed'] = 'true'
+	return response
+
+
+def _queued_messages(request):
+	storage = messages.get_messages(request)
+	queued = [[message.level, message.message] for message in storage]
+	# Iterating marks messages as read; keep them for the redirected page
+	storage.used = False
+	return queued
+
+
+def idempotent(view_func):
+	# POSTs carrying {% idempotency_field %} run once per token; repeats get the
+	# first redirect and flash messages back without touching the database again
+	@wraps(view_func)
+	def _wrapped(request, *args, **kwargs):
+		key = request.POST.get(IDEMPOTENCY_FIELD, '').strip() if request.method == 'POST' else ''
+		if not key or len(key) > 64 or not request.user.is_authenticated:
+			return view_func(request, *args, **kwargs)
+		scope = request.resolver_match.view_name if request.resolver_match else view_func.__name__
+
+		record = _claim(request, key, scope)
+		if record is None:
+			return _replay(request, key, scope)
+		try:
+			response = view_func(request, *args, **kwargs)
+		except BaseException:
+			record.delete()
+			raise
+		if response.has_header('Location'):
+			record.status_code = response.status_code
+			record.location = response['Location']
+			record.messages = _queued_messages(request)
+			record.save(update_fields=['status_code', 'location', 'messages'])
+		else:
+			# A re-rendered form (validation error) changed nothing; let it be sent again
+			record.delete()
+		return response
+
+	return _wrapped
+
+
+def purge_expired_keys(batch_size=1000, now=None):
+	now = now or timezone.now()
+	purged = 0
+	while True:
+		pks = list(IdempotencyKey.objects.filter(expires_at__lte=now).values_list('pk', flat=True)[:batch_size])
+		if not pks:
+			return purged
+		# Short transactions so form submissions are never blocked for long
+		purged += IdempotencyKey.objects.filter(pk__in=pks).delete()[0]
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.idempotency import purge_expired_keys
+
+
+class Command(BaseCommand):
+	help = 'Delete idempotency keys older than IDEMPOTENCY_KEY_TTL_HOURS.'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--batch-size', type=int, default=1000, help='Keys deleted per transaction.')
+
+	def handle(self, *args, **options):
+		if options['batch_size'] < 1:
+			raise CommandError('--batch-size must be at least 1.')
+		purged = purge_expired_keys(batch_size=options['batch_size'])
+		self.stdout.write(self.style.SUCCESS(f'Purged {purged} expired idempotency key(s).'))
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.tasks import task_backends
+from django.tasks.exceptions import InvalidTaskBackend
+
+from core.backends import DatabaseBackend
+from core.worker import Worker
+
+
+class Command(BaseCommand):
+	help = 'Run queued background tasks from the database task backend.'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--backend', default='default', help='Alias of the TASKS backend to consume.')
+		parser.add_argument('--queue', action='append', dest='queues', help='Queue to consume; repeat for several (defaults to all configured queues).')
+		parser.add_argument('--concurrency', type=int, default=2, help='Tasks run at the same time.')
+		parser.add_argument('--mode', choices=('thread', 'process'), default='thread', help='Run tasks in a thread pool or a process pool.')
+		parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait between polls when idle.')
+		parser.add_argument('--stale-timeout', type=int, default=3600, help='Seconds after which a RUNNING task is assumed lost and retried.')
+		parser.add_argument('--burst', action='store_true', help='Exit once no task is due instead of polling forever.')
+
+	def handle(self, *args, **options):
+		try:
+			backend = task_backends[options['backend']]
+		except InvalidTaskBackend as exc:
+			raise CommandError(str(exc))
+		if not isinstance(backend, DatabaseBackend):
+			raise CommandError(f"TASKS['{options['backend']}'] is not configured with core.backends.DatabaseBackend.")
+		if options['concurrency'] < 1:
+			raise CommandError('--concurrency must be at least 1.')
+		queues = options['queues'] or sorted(backend.queues)
+		unknown = set(queues) - backend.queues
+		if unknown:
+			raise CommandError(f'Unknown queue(s): {", ".join(sorted(unknown))}.')
+
+		worker = Worker(
+			backend_alias=options['backend'],
+			queues=queues,
+			concurrency=options['concurrency'],
+			mode=options['mode'],
+			poll_interval=options['poll_interval'],
+			stale_timeout=options['stale_timeout'],
+			burst=options['burst'],
+			log=self.stdout.write,
+		)
+		worker.run()
@@ -0,0 +1,43 @@
+from django.core.cache import cache
+
+
+METRICS_KEY_PREFIX = 'metrics:'
+METRICS_NAMES_KEY = 'metrics:names'
+
+
+def _register(name):
+	names = cache.get(METRICS_NAMES_KEY) or set()
+	if name not in names:
+		names.add(name)
+		cache.set(METRICS_NAMES_KEY, names, None)
+
+
+def incr(name, delta=1):
+	key = METRICS_KEY_PREFIX + name
+	try:
+		cache.incr(key, delta)
+	except ValueError:
+		if not cache.add(key, delta, None):
+			cache.incr(key, delta)
+		_register(name)
+
+
+def get_counters():
+	names = sorted(cache.get(METRICS_NAMES_KEY) or ())
+	values = cache.get_many([METRICS_KEY_PREFIX + name for name in names])
+	return {name: values.get(METRICS_KEY_PREFIX + name, 0) for name in names}
+
+
+def get_hit_rates(counters=None):
+	# Pairs "<name>.hit" and "<name>.miss" counters into a hit rate per name
+	if counters is None:
+		counters = get_counters()
+	rates = {}
+	for name, hits in counters.items():
+		if not name.endswith('.hit'):
+			continue
+		base = name[:-len('.hit')]
+		misses = counters.get(f'{base}.miss', 0)
+		total = hits + misses
+		rates[base] = {'hits': hits, 'misses': misses, 'hit_rate': round(hits / total, 4) if total else None}
+	return rates
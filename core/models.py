@@ -0,0 +1,65 @@
+from django.conf import settings
+from django.db import models
+from django.tasks import DEFAULT_TASK_QUEUE_NAME, TaskResultStatus
+from django.tasks.base import DEFAULT_TASK_PRIORITY
+from django.utils import timezone
+
+
+class TaskRecord(models.Model):
+	id = models.CharField(max_length=32, primary_key=True)
+	task_path = models.CharField(max_length=255)
+	backend = models.CharField(max_length=100, default='default')
+	queue_name = models.CharField(max_length=100, default=DEFAULT_TASK_QUEUE_NAME)
+	priority = models.SmallIntegerField(default=DEFAULT_TASK_PRIORITY)
+	status = models.CharField(max_length=20, choices=TaskResultStatus.choices, default=TaskResultStatus.READY)
+	args = models.JSONField(default=list)
+	kwargs = models.JSONField(default=dict)
+	run_after = models.DateTimeField(null=True, blank=True)
+	enqueued_at = models.DateTimeField(default=timezone.now)
+	started_at = models.DateTimeField(null=True, blank=True)
+	finished_at = models.DateTimeField(null=True, blank=True)
+	last_attempted_at = models.DateTimeField(null=True, blank=True)
+	attempts = models.PositiveIntegerField(default=0)
+	max_attempts = models.PositiveIntegerField(default=1)
+	worker_ids = models.JSONField(default=list)
+	errors = models.JSONField(default=list)
+	return_value = models.JSONField(null=True, blank=True)
+
+	class Meta:
+		ordering = ['-enqueued_at']
+		indexes = [
+			models.Index(fields=['status', 'queue_name', 'run_after'], name='task_status_queue_idx'),
+		]
+
+	def __str__(self):
+		return f"{self.task_path} [{self.id}] ({self.status})"
+
+	@property
+	def task_name(self):
+		return self.task_path.rsplit('.', 1)[-1]
+
+	@property
+	def last_error(self):
+		return self.errors[-1] if self.errors else None
+
+
+class IdempotencyKey(models.Model):
+	# One row per submitted form token; a repeated POST with the same token replays
+	# the stored outcome instead of running the view again
+	key = models.CharField(max_length=64)
+	user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+	scope = models.CharField(max_length=100)
+	# Null while the first submission is still running
+	status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+	location = models.CharField(max_length=500, blank=True)
+	messages = models.JSONField(default=list)
+	created_at = models.DateTimeField(default=timezone.now)
+	expires_at = models.DateTimeField(db_index=True)
+
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=['user', 'scope', 'key'], name='idempotency_key_unique'),
+		]
+
+	def __str__(self):
+		return f"{self.scope} {self.key} ({self.status_code or 'pending'})"
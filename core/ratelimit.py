@@ -0,0 +1,88 @@
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.shortcuts import render
+
+from . import metrics
+
+
+RATE_LIMIT_KEY_PREFIX = 'ratelimit:'
+RATE_PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+RATE_LIMITED_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+
+def parse_rate(rate):
+	# '10/m' -> (10, 60): a bucket of 10 tokens that refills completely every minute
+	count, _, period = rate.partition('/')
+	try:
+		count = int(count)
+		seconds = RATE_PERIODS[period]
+	except (ValueError, KeyError):
+		raise ImproperlyConfigured(f"Invalid rate {rate!r}; use '<count>/<s|m|h|d>'.") from None
+	if count < 1:
+		raise ImproperlyConfigured(f'Invalid rate {rate!r}; the count must be at least 1.')
+	return count, seconds
+
+
+def take_token(key, capacity, period, now=None):
+	# Token bucket: up to `capacity` requests in a burst, then one every period/capacity
+	# seconds. Returns (allowed, seconds until the next token). The read-modify-write
+	# isn't atomic, so concurrent requests may briefly get a token or two extra.
+	now = time.time() if now is None else now
+	refill_rate = capacity / period
+	tokens, stamp = cache.get(RATE_LIMIT_KEY_PREFIX + key) or (capacity, now)
+	tokens = min(capacity, tokens + (now - stamp) * refill_rate)
+	if tokens < 1:
+		return False, (1 - tokens) / refill_rate
+	# An untouched bucket refills within one period, so the key can expire then
+	cache.set(RATE_LIMIT_KEY_PREFIX + key, (tokens - 1, now), period)
+	return True, 0
+
+
+def client_ip(request):
+	header = settings.RATE_LIMIT_CLIENT_IP_HEADER
+	if header and request.META.get(header):
+		# e.g. X-Forwarded-For from a trusted reverse proxy: the first address is the client
+		return request.META[header].split(',')[0].strip()
+	return request.META.get('REMOTE_ADDR', '')
+
+
+class RateLimitMiddleware:
+	# Applies settings.RATE_LIMITS to state-changing requests by URL name, with one
+	# bucket per client IP and, for signed-in users, one per user.
+	def __init__(self, get_response):
+		self.get_response = get_response
+		self.limits = {
+			url_name: [(scope, *parse_rate(rate)) for scope, rate in scopes.items() if rate]
+			for url_name, scopes in settings.RATE_LIMITS.items()
+		}
+		for url_name, limits in self.limits.items():
+			unknown = {scope for scope, capacity, period in limits} - {'ip', 'user'}
+			if unknown:
+				raise ImproperlyConfigured(f"RATE_LIMITS[{url_name!r}] has unknown bucket(s) {sorted(unknown)}; use 'ip' or 'user'.")
+
+	def __call__(self, request):
+		return self.get_response(request)
+
+	def process_view(self, request, view_func, view_args, view_kwargs):
+		if not settings.RATE_LIMIT_ENABLED or request.method not in RATE_LIMITED_METHODS:
+			return None
+		url_name = request.resolver_match.view_name if request.resolver_match else None
+		for scope, capacity, period in self.limits.get(url_name, ()):
+			if scope == 'ip':
+				ident = client_ip(request)
+			elif request.user.is_authenticated:
+				ident = request.user.pk
+			else:
+				continue
+			allowed, retry_after = take_token(f'{url_name}:{scope}:{ident}', capacity, period)
+			if not allowed:
+				metrics.incr(f'ratelimit.{url_name}.shed')
+				metrics.incr(f'ratelimit.{url_name}.{scope}.shed')
+				response = render(request, 'core/rate_limited.html', {'retry_after': math.ceil(retry_after)}, status=429)
+				response['Retry-After'] = str(math.ceil(retry_after))
+				return response
+		return None
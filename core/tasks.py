@@ -0,0 +1,8 @@
+from django.tasks import task
+
+from .idempotency import purge_expired_keys
+
+
+@task(priority=-10)
+def purge_idempotency_keys():
+	return purge_expired_keys()
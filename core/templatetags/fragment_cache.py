@@ -0,0 +1,50 @@
+from django import template
+from django.core.cache import InvalidCacheBackendError, caches
+from django.core.cache.utils import make_template_fragment_key
+
+from core import metrics
+
+
+register = template.Library()
+
+
+class FragmentCacheNode(template.Node):
+	def __init__(self, nodelist, expire_time, fragment_name, vary_on):
+		self.nodelist = nodelist
+		self.expire_time = expire_time
+		self.fragment_name = fragment_name
+		self.vary_on = vary_on
+
+	def render(self, context):
+		try:
+			fragment_cache = caches['template_fragments']
+		except InvalidCacheBackendError:
+			fragment_cache = caches['default']
+		fragment_name = self.fragment_name.resolve(context)
+		vary_on = [var.resolve(context) for var in self.vary_on]
+		cache_key = make_template_fragment_key(fragment_name, vary_on)
+		value = fragment_cache.get(cache_key)
+		if value is None:
+			metrics.incr(f'fragment.{fragment_name}.miss')
+			value = self.nodelist.render(context)
+			fragment_cache.set(cache_key, value, self.expire_time.resolve(context))
+		else:
+			metrics.incr(f'fragment.{fragment_name}.hit')
+		return value
+
+
+# Like {% cache %}, but counts hits and misses per fragment name:
+# {% fragment_cache <timeout> '<name>' [var1] [var2] ... %} ... {% endfragment_cache %}
+@register.tag('fragment_cache')
+def do_fragment_cache(parser, token):
+	nodelist = parser.parse(('endfragment_cache',))
+	parser.delete_first_token()
+	tokens = token.split_contents()
+	if len(tokens) < 3:
+		raise template.TemplateSyntaxError(f"'{tokens[0]}' tag requires at least 2 arguments.")
+	return FragmentCacheNode(
+		nodelist,
+		parser.compile_filter(tokens[1]),
+		parser.compile_filter(tokens[2]),
+		[parser.compile_filter(t) for t in tokens[3:]],
+	)
@@ -0,0 +1,13 @@
+from django import template
+from django.utils.html import format_html
+
+from core.idempotency import IDEMPOTENCY_FIELD, new_idempotency_key
+
+
+register = template.Library()
+
+
+# A fresh token per rendered form; views wrapped in @idempotent run once per token
+@register.simple_tag
+def idempotency_field():
+	return format_html('<input type="hidden" name="{}" value="{}">', IDEMPOTENCY_FIELD, new_idempotency_key())
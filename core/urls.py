@@ -0,0 +1,8 @@
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path('metrics/', views.metrics_report, name='metrics_report'),
+    path('jobs/', views.task_list, name='task_list'),
+]
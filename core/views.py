@@ -0,0 +1,64 @@
+from django.contrib import messages
+from django.db.models import Count
+from django.http import JsonResponse
+from django.shortcuts import redirect, render
+from django.tasks import TaskResultStatus
+from django.utils.module_loading import import_string
+
+from supplies.views import staff_required
+
+from . import metrics
+from .models import TaskRecord
+
+
+# Jobs staff can queue by hand from the background jobs page
+MAINTENANCE_TASKS = {
+	'prerender_all_receipts': ('Pre-render approved receipts', 'requisitions.tasks.prerender_all_receipts'),
+	'refresh_supply_forecasts': ('Recompute stock forecasts', 'supplies.tasks.refresh_supply_forecasts'),
+	'create_stock_checkpoint': ('Checkpoint last month-end stock', 'supplies.tasks.create_stock_checkpoint'),
+	'archive_old_requests': ('Archive old decided requests', 'requisitions.tasks.archive_old_requests'),
+	'prune_old_request_events': ('Prune live request feed events', 'requisitions.tasks.prune_old_request_events'),
+	'purge_idempotency_keys': ('Purge expired form tokens', 'core.tasks.purge_idempotency_keys'),
+	'purge_retired_supplies': ('Purge retired supplies without history', 'supplies.tasks.purge_retired_supplies'),
+}
+RECENT_TASKS_LIMIT = 50
+
+
+@staff_required
+def metrics_report(request):
+	counters = metrics.get_counters()
+	return JsonResponse({
+		'counters': counters,
+		'hit_rates': metrics.get_hit_rates(counters),
+	})
+
+
+@staff_required
+def task_list(request):
+	if request.method == 'POST':
+		entry = MAINTENANCE_TASKS.get(request.POST.get('task'))
+		if entry is None:
+			messages.error(request, 'Unknown background job.')
+		else:
+			label, path = entry
+			result = import_string(path).enqueue()
+			messages.success(request, f'{label} queued as job {result.id[:8]}.')
+		return redirect('task_list')
+
+	active_tasks = (
+		TaskRecord.objects.filter(status__in=[TaskResultStatus.READY, TaskResultStatus.RUNNING])
+		.defer('errors', 'return_value')
+		.order_by('-status', '-priority', 'enqueued_at')
+	)
+	recent_tasks = (
+		TaskRecord.objects.filter(status__in=[TaskResultStatus.SUCCESSFUL, TaskResultStatus.FAILED])
+		.order_by('-finished_at')[:RECENT_TASKS_LIMIT]
+	)
+	counts = {row['status']: row['total'] for row in TaskRecord.objects.values('status').annotate(total=Count('pk'))}
+	context = {
+		'active_tasks': active_tasks,
+		'recent_tasks': recent_tasks,
+		'status_counts': [(label, counts.get(value, 0)) for value, label in TaskResultStatus.choices],
+		'maintenance_tasks': [(name, label) for name, (label, path) in MAINTENANCE_TASKS.items()],
+	}
+	return render(request, 'core/task_list.html', context)
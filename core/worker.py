@@ -0,0 +1,218 @@
+import logging
+import os
+import signal
+import socket
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import timedelta
+from multiprocessing import get_context
+from traceback import format_exception
+
+import django
+from django.db import OperationalError, connections
+from django.db.models import F, Q
+from django.tasks import TaskContext, TaskResultStatus, task_backends
+from django.tasks.signals import task_finished, task_started
+from django.utils import timezone
+from django.utils.json import normalize_json
+
+
+# core.models is imported inside the functions: process-pool children import this
+# module to unpickle execute_task before _init_process has set Django up.
+
+logger = logging.getLogger(__name__)
+
+
+def _worker_id():
+	return f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+
+
+def _error(exc):
+	exc_type = type(exc)
+	return {
+		'exception_class_path': f'{exc_type.__module__}.{exc_type.__qualname__}',
+		'traceback': ''.join(format_exception(exc)),
+	}
+
+
+def claim_tasks(backend_alias, queues, limit):
+	from .models import TaskRecord
+
+	now = timezone.now()
+	candidates = list(
+		TaskRecord.objects.filter(status=TaskResultStatus.READY, backend=backend_alias, queue_name__in=queues)
+		.filter(Q(run_after__isnull=True) | Q(run_after__lte=now))
+		.order_by('-priority', 'enqueued_at')
+		.values_list('pk', flat=True)[:limit]
+	)
+	claimed = []
+	for pk in candidates:
+		# Only one worker wins the READY -> RUNNING transition for a row
+		won = TaskRecord.objects.filter(pk=pk, status=TaskResultStatus.READY).update(
+			status=TaskResultStatus.RUNNING,
+			started_at=now,
+			last_attempted_at=now,
+			attempts=F('attempts') + 1,
+		)
+		if won:
+			claimed.append(pk)
+	return claimed
+
+
+def _release(running_tasks):
+	# Hand RUNNING tasks back to the queue, or fail them once out of attempts
+	failed = running_tasks.filter(attempts__gte=F('max_attempts')).update(
+		status=TaskResultStatus.FAILED, finished_at=timezone.now()
+	)
+	retried = running_tasks.update(status=TaskResultStatus.READY)
+	return retried, failed
+
+
+def requeue_stale_tasks(backend_alias, timeout):
+	from .models import TaskRecord
+
+	# Tasks left RUNNING by a worker that died
+	cutoff = timezone.now() - timedelta(seconds=timeout)
+	return _release(TaskRecord.objects.filter(
+		status=TaskResultStatus.RUNNING, backend=backend_alias, last_attempted_at__lt=cutoff
+	))
+
+
+def release_task(pk):
+	from .models import TaskRecord
+
+	return _release(TaskRecord.objects.filter(pk=pk, status=TaskResultStatus.RUNNING))
+
+
+def execute_task(pk):
+	from .models import TaskRecord
+
+	try:
+		record = TaskRecord.objects.get(pk=pk)
+		backend = task_backends[record.backend]
+		record.worker_ids.append(_worker_id())
+		try:
+			result = backend.to_result(record)
+		except Exception as exc:
+			# The task function was renamed or removed since it was queued
+			record.errors.append(_error(exc))
+			record.status = TaskResultStatus.FAILED
+			record.finished_at = timezone.now()
+			record.save(update_fields=['worker_ids', 'errors', 'status', 'finished_at'])
+			return record.status
+
+		task_started.send(type(backend), task_result=result)
+		task = result.task
+		try:
+			if task.takes_context:
+				return_value = task.call(TaskContext(task_result=result), *record.args, **record.kwargs)
+			else:
+				return_value = task.call(*record.args, **record.kwargs)
+			record.return_value = normalize_json(return_value)
+		except KeyboardInterrupt:
+			raise
+		except BaseException as exc:
+			logger.exception('Task %s (%s) failed on attempt %s', record.task_path, pk, record.attempts)
+			record.errors.append(_error(exc))
+			if record.attempts < record.max_attempts:
+				# Exponential backoff: delay, 2x delay, 4x delay, ...
+				delay = backend.retry_delay * 2 ** (record.attempts - 1)
+				record.status = TaskResultStatus.READY
+				record.run_after = timezone.now() + timedelta(seconds=delay)
+			else:
+				record.status = TaskResultStatus.FAILED
+				record.finished_at = timezone.now()
+		else:
+			record.status = TaskResultStatus.SUCCESSFUL
+			record.finished_at = timezone.now()
+		record.save(update_fields=['worker_ids', 'errors', 'status', 'run_after', 'finished_at', 'return_value'])
+
+		if record.status != TaskResultStatus.READY:
+			task_finished.send(type(backend), task_result=backend.to_result(record, task))
+		return record.status
+	finally:
+		# Pool threads and processes outlive the task; don't leave connections open
+		connections.close_all()
+
+
+def _init_process():
+	# Spawned children start from a fresh interpreter
+	django.setup()
+
+
+class Worker:
+	def __init__(self, backend_alias='default', queues=None, concurrency=2, mode='thread',
+			poll_interval=1.0, stale_timeout=3600, burst=False, log=None):
+		self.backend_alias = backend_alias
+		self.queues = list(queues or task_backends[backend_alias].queues)
+		self.concurrency = concurrency
+		self.mode = mode
+		self.poll_interval = poll_interval
+		self.stale_timeout = stale_timeout
+		self.burst = burst
+		self.log = log or logger.info
+		self.stopping = False
+		self.completed = 0
+		self._wake = threading.Event()
+
+	def _executor(self):
+		if self.mode == 'process':
+			# Spawn rather than fork so children never share the parent's DB connections
+			return ProcessPoolExecutor(
+				max_workers=self.concurrency, mp_context=get_context('spawn'), initializer=_init_process
+			)
+		return ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='task-worker')
+
+	def stop(self, *args):
+		self.stopping = True
+		self._wake.set()
+
+	def _collect(self, running):
+		for future in [future for future in running if future.done()]:
+			pk = running.pop(future)
+			try:
+				future.result()
+				self.completed += 1
+			except Exception:
+				# The pool itself failed (e.g. a child process died), not the task
+				logger.exception('Worker pool failed to run task %s', pk)
+				release_task(pk)
+		return running
+
+	def run(self):
+		if threading.current_thread() is threading.main_thread():
+			signal.signal(signal.SIGTERM, self.stop)
+			signal.signal(signal.SIGINT, self.stop)
+
+		retried, failed = requeue_stale_tasks(self.backend_alias, self.stale_timeout)
+		if retried or failed:
+			self.log(f'Requeued {retried} and failed {failed} stale task(s).')
+		self.log(f'Worker started: {self.concurrency} {self.mode}(s), queues {", ".join(self.queues)}.')
+
+		running = {}
+		with self._executor() as executor:
+			while not self.stopping:
+				running = self._collect(running)
+				claimed = []
+				free = self.concurrency - len(running)
+				if free > 0:
+					try:
+						claimed = claim_tasks(self.backend_alias, self.queues, free)
+					except OperationalError:
+						# SQLite may be briefly locked by a task that is writing
+						logger.warning('Could not claim tasks; retrying', exc_info=True)
+				for pk in claimed:
+					running[executor.submit(execute_task, pk)] = pk
+				if self.burst and not running:
+					break
+				if not claimed:
+					if running:
+						wait(running, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+					else:
+						self._wake.wait(self.poll_interval)
+			# Let in-flight tasks finish before shutting the pool down
+			wait(running)
+			self._collect(running)
+		connections.close_all()
+		self.log(f'Worker stopped after {self.completed} task(s).')
+		return self.completed
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class RequisitionsConfig(AppConfig):
     name = 'requisitions'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,82 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ArchivedSupplyRequest, SupplyRequest, SupplyRequestItem
+from .reports import forget_month_totals, month_of
+
+
+def archive_cutoff(days=None):
+	if days is None:
+		days = settings.REQUEST_ARCHIVE_AFTER_DAYS
+	return timezone.now() - timedelta(days=days)
+
+
+def archivable_requests(cutoff):
+	# Decided requests only; legacy rows without a decision time fall back to the request time
+	return SupplyRequest.objects.exclude(status=SupplyRequest.STATUS_PENDING).filter(
+		Q(decision_at__lt=cutoff) | Q(decision_at__isnull=True, requested_at__lt=cutoff)
+	)
+
+
+def _item_snapshot(item):
+	supply = item.supply
+	return {
+		'supply_id': supply.id,
+		'name': supply.name,
+		'description': supply.description,
+		'size_spec': supply.size_spec,
+		'category': supply.category,
+		'unit': supply.unit,
+		'quantity': item.quantity,
+		'price_per_unit': str(item.price_per_unit) if item.price_per_unit is not None else None,
+		'item_date_needed': item.item_date_needed.isoformat() if item.item_date_needed else None,
+	}
+
+
+def _archive_row(req, items):
+	return ArchivedSupplyRequest(
+		id=req.id,
+		user_id=req.user_id,
+		status=req.status,
+		requested_at=req.requested_at,
+		requester_name=req.requester_name,
+		organization_name=req.organization_name,
+		date_needed=req.date_needed,
+		attention=req.attention,
+		destination=req.destination,
+		department=req.department,
+		notes=req.notes,
+		decision_at=req.decision_at,
+		decided_by_id=req.decided_by_id,
+		items=[_item_snapshot(item) for item in items],
+	)
+
+
+def archive_batch(pks):
+	# Copy and delete in one transaction so a request is never in both tables or neither
+	with transaction.atomic():
+		requests = list(SupplyRequest.objects.filter(pk__in=pks).order_by('pk'))
+		items = {}
+		for item in SupplyRequestItem.objects.filter(request_id__in=pks).select_related('supply').order_by('pk'):
+			items.setdefault(item.request_id, []).append(item)
+		ArchivedSupplyRequest.objects.bulk_create([_archive_row(req, items.get(req.id, [])) for req in requests])
+		SupplyRequestItem.objects.filter(request_id__in=pks).delete()
+		SupplyRequest.objects.filter(pk__in=pks).delete()
+		# Cached department totals of these months were built from the rows just moved
+		months = {month_of(req.decision_at or req.requested_at) for req in requests}
+		transaction.on_commit(lambda: forget_month_totals(months))
+	return len(requests)
+
+
+def archive_decided_requests(days=None, batch_size=500):
+	cutoff = archive_cutoff(days)
+	archived = 0
+	while True:
+		pks = list(archivable_requests(cutoff).order_by('pk').values_list('pk', flat=True)[:batch_size])
+		if not pks:
+			return archived
+		archived += archive_batch(pks)
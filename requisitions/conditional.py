@@ -0,0 +1,39 @@
+from django.db.models import Count, Max, Q
+
+from supplies.catalog import get_catalog_version
+from supplies.conditional import has_pending_messages, make_etag
+
+from .models import SupplyRequest
+
+
+def user_requests_stamp(request):
+	# One aggregate over the user's rows, shared by the ETag and Last-Modified callbacks
+	if not hasattr(request, '_user_requests_stamp'):
+		request._user_requests_stamp = SupplyRequest.objects.filter(user=request.user).aggregate(
+			last_requested=Max('requested_at'),
+			last_decided=Max('decision_at'),
+			total=Count('id'),
+			archived=Count('id', filter=Q(is_archived=True)),
+		)
+	return request._user_requests_stamp
+
+
+def user_requests_etag(request, *args, **kwargs):
+	if has_pending_messages(request):
+		return None
+	stamp = user_requests_stamp(request)
+	return make_etag(
+		request,
+		'requests',
+		stamp['last_requested'],
+		stamp['last_decided'],
+		stamp['total'],
+		stamp['archived'],
+		get_catalog_version(),
+	)
+
+
+def user_requests_last_modified(request, *args, **kwargs):
+	stamp = user_requests_stamp(request)
+	times = [t for t in (stamp['last_requested'], stamp['last_decided']) if t]
+	return max(times) if times else None
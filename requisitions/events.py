@@ -0,0 +1,82 @@
+import asyncio
+import json
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.db.models import Max
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from supplies.analytics import pending_requests_count
+
+from .models import RequestEvent, SupplyRequest
+
+
+EVENT_POLL_INTERVAL = 2
+EVENT_HEARTBEAT_INTERVAL = 15
+EVENT_BATCH_SIZE = 100
+# Browsers reconnect by themselves and resume from Last-Event-ID, so streams are
+# capped rather than held open forever (which would pin a worker under WSGI)
+EVENT_STREAM_MAX_SECONDS = 300
+EVENT_RETRY_MS = 3000
+EVENT_RETENTION_DAYS = 7
+
+
+def latest_event_id():
+	return RequestEvent.objects.aggregate(last=Max('id'))['last'] or 0
+
+
+def load_events(request, after, include_rows=False):
+	events = list(RequestEvent.objects.filter(id__gt=after).order_by('id')[:EVENT_BATCH_SIZE])
+	if not events:
+		return after, []
+	# Only the newest event per request matters; each message carries the request as it is now
+	newest = {}
+	for event in events:
+		newest.pop(event.request_id, None)
+		newest[event.request_id] = event.id
+	requests = SupplyRequest.objects.filter(pk__in=newest, is_archived=False).select_related('user')
+	if include_rows:
+		requests = requests.prefetch_related('items__supply')
+	requests = requests.in_bulk()
+	pending_count = pending_requests_count()
+
+	messages = []
+	for request_id, event_id in newest.items():
+		req = requests.get(request_id)
+		payload = {
+			'request_id': request_id,
+			# None once the request is archived or deleted: clients just drop its row
+			'status': req.status if req else None,
+			'pending_count': pending_count,
+		}
+		if include_rows and req:
+			payload['row'] = render_to_string(
+				'requisitions/partials/request_row.html', {'req': req, 'show_status': False}, request=request
+			)
+		messages.append((event_id, payload))
+	return events[-1].id, messages
+
+
+def format_event(event_id, payload):
+	return f'id: {event_id}\nevent: request\ndata: {json.dumps(payload)}\n\n'
+
+
+async def event_stream(request, after, include_rows=False):
+	yield f'retry: {EVENT_RETRY_MS}\n\n'
+	started = last_sent = time.monotonic()
+	while time.monotonic() - started < EVENT_STREAM_MAX_SECONDS:
+		after, messages = await sync_to_async(load_events)(request, after, include_rows)
+		for event_id, payload in messages:
+			yield format_event(event_id, payload)
+			last_sent = time.monotonic()
+		if time.monotonic() - last_sent >= EVENT_HEARTBEAT_INTERVAL:
+			# Comment line: keeps proxies from closing an idle connection
+			yield ': keep-alive\n\n'
+			last_sent = time.monotonic()
+		await asyncio.sleep(EVENT_POLL_INTERVAL)
+
+
+def prune_request_events(days=EVENT_RETENTION_DAYS):
+	return RequestEvent.objects.filter(created_at__lt=timezone.now() - timedelta(days=days)).delete()[0]
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from requisitions.archive import archivable_requests, archive_cutoff, archive_decided_requests
+
+
+class Command(BaseCommand):
+	help = 'Move decided requests older than REQUEST_ARCHIVE_AFTER_DAYS into the archive table.'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--days', type=int, default=None, help=f'Archive requests decided more than this many days ago (default {settings.REQUEST_ARCHIVE_AFTER_DAYS}).')
+		parser.add_argument('--batch-size', type=int, default=500, help='Requests moved per transaction.')
+		parser.add_argument('--dry-run', action='store_true', help='Only report how many requests would be archived.')
+
+	def handle(self, *args, **options):
+		if options['days'] is not None and options['days'] < 0:
+			raise CommandError('--days cannot be negative.')
+		if options['dry_run']:
+			total = archivable_requests(archive_cutoff(options['days'])).count()
+			self.stdout.write(f'{total} request(s) would be archived.')
+			return
+		archived = archive_decided_requests(options['days'], batch_size=options['batch_size'])
+		self.stdout.write(self.style.SUCCESS(f'Archived {archived} request(s).'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from requisitions.receipts import prerender_receipts
+from requisitions.tasks import prerender_all_receipts
+
+
+class Command(BaseCommand):
+	help = 'Render and store receipts for approved requests that are not cached yet.'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--batch-size', type=int, default=200, help='Requests fetched per batch.')
+		parser.add_argument('--force', action='store_true', help='Re-render receipts that are already stored.')
+		parser.add_argument('--enqueue', action='store_true', help='Queue the work for run_worker instead of running it now.')
+
+	def handle(self, *args, **options):
+		if options['enqueue']:
+			result = prerender_all_receipts.enqueue(force=options['force'])
+			self.stdout.write(self.style.SUCCESS(f'Queued job {result.id}.'))
+			return
+		rendered = prerender_receipts(batch_size=options['batch_size'], force=options['force'])
+		self.stdout.write(self.style.SUCCESS(f'Rendered {rendered} receipt(s).'))
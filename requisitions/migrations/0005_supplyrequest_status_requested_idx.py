@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-19 00:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('requisitions', '0004_supplyrequest_is_archived'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='supplyrequest',
+            index=models.Index(fields=['status', 'requested_at'], name='request_status_requested_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 6.0 on 2026-10-19 01:02
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('requisitions', '0005_supplyrequest_status_requested_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedSupplyRequest',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('approved', 'Approved'), ('rejected', 'Rejected')], max_length=20)),
+                ('requested_at', models.DateTimeField()),
+                ('requester_name', models.CharField(blank=True, max_length=255)),
+                ('organization_name', models.CharField(blank=True, max_length=255)),
+                ('date_needed', models.DateField(blank=True, null=True)),
+                ('attention', models.CharField(blank=True, max_length=255)),
+                ('destination', models.CharField(blank=True, max_length=255)),
+                ('department', models.CharField(blank=True, max_length=255)),
+                ('notes', models.TextField(blank=True)),
+                ('decision_at', models.DateTimeField(blank=True, null=True)),
+                ('items', models.JSONField(default=list)),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('decided_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_requests', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'requested_at'], name='archived_user_requested_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 6.0 on 2026-10-19 01:24
+
+import re
+
+from django.db import migrations, models
+
+
+def _office_key(department):
+    # Frozen copy of requisitions.models.normalize_office_key
+    key = re.sub(r"[.'’]", '', (department or '').casefold())
+    return ' '.join(re.sub(r'[^0-9a-z]+', ' ', key).split())
+
+
+def backfill_office_key(apps, schema_editor):
+    SupplyRequest = apps.get_model('requisitions', 'SupplyRequest')
+    batch = []
+    for request in SupplyRequest.objects.exclude(department='').only('pk', 'department').iterator(chunk_size=2000):
+        request.office_key = _office_key(request.department)
+        batch.append(request)
+        if len(batch) >= 2000:
+            SupplyRequest.objects.bulk_update(batch, ['office_key'])
+            batch = []
+    if batch:
+        SupplyRequest.objects.bulk_update(batch, ['office_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('requisitions', '0007_requestevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='supplyrequest',
+            name='office_key',
+            field=models.CharField(blank=True, db_index=True, max_length=255),
+        ),
+        migrations.RunPython(backfill_office_key, migrations.RunPython.noop),
+    ]
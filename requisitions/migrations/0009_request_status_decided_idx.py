@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-19 01:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('requisitions', '0008_supplyrequest_office_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='supplyrequest',
+            index=models.Index(fields=['status', 'decision_at'], name='request_status_decided_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 6.0 on 2026-10-19 01:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('requisitions', '0009_request_status_decided_idx'),
+        ('supplies', '0012_supply_retirement'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='supplyrequestitem',
+            name='supply',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='request_items', to='supplies.supply'),
+        ),
+    ]
@@ -1,10 +1,22 @@
+import re
+from datetime import date
+from decimal import Decimal
+from types import SimpleNamespace
+
 from django.conf import settings
 from django.db import models
 from django.utils import timezone
+from django.utils.functional import cached_property
 
 from supplies.models import Supply
 
 
+def normalize_office_key(department):
+	# Dots and apostrophes vanish (abbreviations), other punctuation splits words
+	key = re.sub(r"[.'’]", '', (department or '').casefold())
+	return ' '.join(re.sub(r'[^0-9a-z]+', ' ', key).split())
+
+
 class SupplyRequest(models.Model):
 	STATUS_PENDING = 'pending'
 	STATUS_APPROVED = 'approved'
@@ -25,6 +37,8 @@ class SupplyRequest(models.Model):
 	attention = models.CharField(max_length=255, blank=True)
 	destination = models.CharField(max_length=255, blank=True)
 	department = models.CharField(max_length=255, blank=True)
+	# Normalized department used to group reports: "L.G.C.D.", " lgcd" and "LGCD" match
+	office_key = models.CharField(max_length=255, blank=True, db_index=True)
 	notes = models.TextField(blank=True)
 	decision_at = models.DateTimeField(null=True, blank=True)
 	decided_by = models.ForeignKey(
@@ -36,13 +50,25 @@ class SupplyRequest(models.Model):
 	)
 	is_archived = models.BooleanField(default=False)
 
+	class Meta:
+		indexes = [
+			models.Index(fields=['status', 'requested_at'], name='request_status_requested_idx'),
+			models.Index(fields=['status', 'decision_at'], name='request_status_decided_idx'),
+		]
+
 	def __str__(self):
 		return f"Request #{self.id} by {self.user} ({self.status})"
 
+	def save(self, *args, **kwargs):
+		self.office_key = normalize_office_key(self.department)
+		if kwargs.get('update_fields') is not None and 'department' in kwargs['update_fields']:
+			kwargs['update_fields'] = {*kwargs['update_fields'], 'office_key'}
+		super().save(*args, **kwargs)
+
 
 class SupplyRequestItem(models.Model):
 	request = models.ForeignKey(SupplyRequest, on_delete=models.CASCADE, related_name='items')
-	supply = models.ForeignKey(Supply, on_delete=models.CASCADE, related_name='request_items')
+	supply = models.ForeignKey(Supply, on_delete=models.PROTECT, related_name='request_items')
 	quantity = models.PositiveIntegerField()
 	price_per_unit = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
 	item_date_needed = models.DateField(null=True, blank=True)
@@ -55,3 +81,70 @@ class SupplyRequestItem(models.Model):
 		if self.price_per_unit is None:
 			return None
 		return self.price_per_unit * self.quantity
+
+
+class ArchivedSupplyRequest(models.Model):
+	# Keeps the id of the SupplyRequest it replaced so receipt links and cached receipts still resolve
+	id = models.BigIntegerField(primary_key=True)
+	user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='archived_requests')
+	status = models.CharField(max_length=20, choices=SupplyRequest.STATUS_CHOICES)
+	requested_at = models.DateTimeField()
+	requester_name = models.CharField(max_length=255, blank=True)
+	organization_name = models.CharField(max_length=255, blank=True)
+	date_needed = models.DateField(null=True, blank=True)
+	attention = models.CharField(max_length=255, blank=True)
+	destination = models.CharField(max_length=255, blank=True)
+	department = models.CharField(max_length=255, blank=True)
+	notes = models.TextField(blank=True)
+	decision_at = models.DateTimeField(null=True, blank=True)
+	decided_by = models.ForeignKey(
+		settings.AUTH_USER_MODEL,
+		on_delete=models.SET_NULL,
+		null=True,
+		blank=True,
+		related_name='+',
+	)
+	# Line items with the supply details as they were when archived
+	items = models.JSONField(default=list)
+	archived_at = models.DateTimeField(default=timezone.now)
+
+	class Meta:
+		indexes = [
+			models.Index(fields=['user', 'requested_at'], name='archived_user_requested_idx'),
+		]
+
+	def __str__(self):
+		return f"Archived request #{self.id} by {self.user} ({self.status})"
+
+	@cached_property
+	def line_items(self):
+		# Same shape as SupplyRequestItem for the history and receipt templates
+		rows = []
+		for row in self.items:
+			price = row.get('price_per_unit')
+			needed = row.get('item_date_needed')
+			rows.append(SimpleNamespace(
+				quantity=row['quantity'],
+				price_per_unit=Decimal(price) if price is not None else None,
+				item_date_needed=date.fromisoformat(needed) if needed else None,
+				supply=SimpleNamespace(
+					id=row.get('supply_id'),
+					name=row.get('name', ''),
+					description=row.get('description', ''),
+					size_spec=row.get('size_spec', ''),
+					category=row.get('category', ''),
+					unit=row.get('unit', ''),
+				),
+			))
+		return rows
+
+
+class RequestEvent(models.Model):
+	# Append-only change feed for the live staff views: one row per new or decided
+	# request, read by id so streams can resume from the last event they saw
+	request_id = models.BigIntegerField()
+	status = models.CharField(max_length=20, choices=SupplyRequest.STATUS_CHOICES)
+	created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+	def __str__(self):
+		return f"Request #{self.request_id} {self.status}"
@@ -0,0 +1,80 @@
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Prefetch
+from django.template.loader import render_to_string
+
+from .models import SupplyRequest, SupplyRequestItem
+
+
+RECEIPT_TEMPLATE = 'requisitions/partials/receipt_body.html'
+# Bump when the receipt template changes so stored receipts are re-rendered
+RECEIPT_CACHE_VERSION = 1
+
+
+def receipt_key(req):
+	raw = f'{RECEIPT_CACHE_VERSION}:{req.pk}:{req.decision_at.isoformat()}'
+	return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _receipt_path(key):
+	return Path(settings.RECEIPT_CACHE_ROOT) / key[:2] / f'{key}.html'
+
+
+def load_receipt(req):
+	try:
+		return _receipt_path(receipt_key(req)).read_text(encoding='utf-8')
+	except FileNotFoundError:
+		return None
+
+
+def store_receipt(req, body):
+	path = _receipt_path(receipt_key(req))
+	path.parent.mkdir(parents=True, exist_ok=True)
+	# Write to a temp file and rename so readers never see a partial receipt
+	fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+	try:
+		with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+			fh.write(body)
+		os.replace(tmp_path, path)
+	except BaseException:
+		os.unlink(tmp_path)
+		raise
+
+
+def render_receipt(req, items=None):
+	if items is None:
+		items = list(req.items.select_related('supply'))
+	return render_to_string(RECEIPT_TEMPLATE, {'req': req, 'items': items})
+
+
+def get_or_render_receipt(req, items=None):
+	body = load_receipt(req)
+	if body is None:
+		body = render_receipt(req, items)
+		store_receipt(req, body)
+	return body
+
+
+def approved_receipts_queryset():
+	return (
+		SupplyRequest.objects.filter(status=SupplyRequest.STATUS_APPROVED, decision_at__isnull=False)
+		.select_related('user', 'decided_by')
+		.prefetch_related(Prefetch('items', queryset=SupplyRequestItem.objects.select_related('supply')))
+		.order_by('pk')
+	)
+
+
+def prerender_receipts(queryset=None, batch_size=200, force=False):
+	if queryset is None:
+		queryset = approved_receipts_queryset()
+	rendered = 0
+	for req in queryset.iterator(chunk_size=batch_size):
+		if not force and load_receipt(req) is not None:
+			continue
+		store_receipt(req, render_receipt(req, list(req.items.all())))
+		rendered += 1
+	return rendered
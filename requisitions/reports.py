@@ -0,0 +1,200 @@
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Count, DecimalField, F, Min, Q, Sum
+from django.utils import timezone
+
+from .models import ArchivedSupplyRequest, SupplyRequest, SupplyRequestItem, normalize_office_key
+
+
+# The current month still changes as requests are approved; earlier months are
+# closed, so their totals are kept much longer (archiving forgets the months it touches)
+OPEN_PERIOD_CACHE_TIMEOUT = 60
+CLOSED_PERIOD_CACHE_TIMEOUT = 30 * 24 * 60 * 60
+REPORT_DEFAULT_MONTHS = 6
+REPORT_MAX_MONTHS = 24
+
+
+def parse_month(raw):
+	try:
+		year, month = raw.split('-')
+		return date(int(year), int(month), 1)
+	except ValueError:
+		raise ValueError('Use YYYY-MM for the report months.') from None
+
+
+def add_months(month, count):
+	index = month.year * 12 + month.month - 1 + count
+	return date(index // 12, index % 12 + 1, 1)
+
+
+def month_range(start, end):
+	months = []
+	while start <= end:
+		months.append(start)
+		start = add_months(start, 1)
+	return months
+
+
+def parse_report_params(params):
+	current = timezone.localdate().replace(day=1)
+	end_raw = params.get('end', '').strip()
+	start_raw = params.get('start', '').strip()
+	end = parse_month(end_raw) if end_raw else current
+	start = parse_month(start_raw) if start_raw else add_months(end, 1 - REPORT_DEFAULT_MONTHS)
+	if start > end:
+		raise ValueError('Start month must be on or before the end month.')
+	if len(month_range(start, end)) > REPORT_MAX_MONTHS:
+		raise ValueError(f'Reports cover at most {REPORT_MAX_MONTHS} months.')
+	# Typed or linked names ("L.G.C.D.", "lgcd") match the same way stored requests are grouped
+	return {'start': start, 'end': end, 'office_key': normalize_office_key(params.get('department', ''))}
+
+
+def _month_start(month):
+	return timezone.make_aware(datetime.combine(month, time.min))
+
+
+def month_of(moment):
+	return timezone.localtime(moment).date().replace(day=1)
+
+
+def _month_key(month):
+	return f'requisitions:department-report:{month:%Y-%m}'
+
+
+def _archived_totals(start, end):
+	# Archived requests keep their items as JSON snapshots, so these are summed here
+	totals = {}
+	archived = ArchivedSupplyRequest.objects.filter(status=SupplyRequest.STATUS_APPROVED).filter(
+		Q(decision_at__gte=start, decision_at__lt=end)
+		| Q(decision_at__isnull=True, requested_at__gte=start, requested_at__lt=end)
+	)
+	for department, items in archived.values_list('department', 'items').iterator(chunk_size=500):
+		office_key = normalize_office_key(department)
+		for item in items:
+			row = totals.setdefault((office_key, item['category']), {
+				'office_key': office_key,
+				'department': department,
+				'category': item['category'],
+				'quantity': 0,
+				'cost': Decimal('0'),
+				'unpriced': 0,
+			})
+			row['department'] = min(row['department'], department)
+			row['quantity'] += item['quantity']
+			if item['price_per_unit'] is None:
+				row['unpriced'] += 1
+			else:
+				row['cost'] += Decimal(item['price_per_unit']) * item['quantity']
+	return totals
+
+
+def month_totals(month):
+	# Stock leaves when a request is approved, so items count in the month of the decision;
+	# old rows without a decision time fall back to when they were requested
+	start, end = _month_start(month), _month_start(add_months(month, 1))
+	items = SupplyRequestItem.objects.filter(request__status=SupplyRequest.STATUS_APPROVED).filter(
+		Q(request__decision_at__gte=start, request__decision_at__lt=end)
+		| Q(request__decision_at__isnull=True, request__requested_at__gte=start, request__requested_at__lt=end)
+	)
+	rows = (
+		items.values('request__office_key', 'supply__category')
+		.annotate(
+			department=Min('request__department'),
+			total_quantity=Sum('quantity'),
+			total_cost=Sum(F('price_per_unit') * F('quantity'), output_field=DecimalField(max_digits=14, decimal_places=2)),
+			unpriced=Count('pk', filter=Q(price_per_unit__isnull=True)),
+		)
+		.order_by()
+	)
+	totals = _archived_totals(start, end)
+	for row in rows:
+		entry = totals.setdefault((row['request__office_key'], row['supply__category']), {
+			'office_key': row['request__office_key'],
+			'department': row['department'],
+			'category': row['supply__category'],
+			'quantity': 0,
+			'cost': Decimal('0'),
+			'unpriced': 0,
+		})
+		entry['department'] = min(entry['department'], row['department'])
+		entry['quantity'] += row['total_quantity']
+		entry['cost'] += row['total_cost'] or Decimal('0')
+		entry['unpriced'] += row['unpriced']
+	return list(totals.values())
+
+
+def forget_month_totals(months):
+	cache.delete_many([_month_key(month) for month in months])
+
+
+def get_month_totals(month):
+	key = _month_key(month)
+	rows = cache.get(key)
+	if rows is None:
+		rows = month_totals(month)
+		closed = month < timezone.localdate().replace(day=1)
+		cache.set(key, rows, CLOSED_PERIOD_CACHE_TIMEOUT if closed else OPEN_PERIOD_CACHE_TIMEOUT)
+	return rows
+
+
+def _empty_cell():
+	return {'quantity': 0, 'cost': Decimal('0')}
+
+
+def department_cross_tab(start, end, office_key=''):
+	# Department x category rows, one cell per month, built from the per-month totals
+	months = month_range(start, end)
+	departments = {}
+	table = {}
+	for index, month in enumerate(months):
+		for row in get_month_totals(month):
+			departments.setdefault(row['office_key'], (row['department'] or '').strip() or '(No department)')
+			if office_key and row['office_key'] != office_key:
+				continue
+			entry = table.get((row['office_key'], row['category']))
+			if entry is None:
+				entry = table[(row['office_key'], row['category'])] = {
+					'office_key': row['office_key'],
+					'category': row['category'] or 'Uncategorized',
+					'cells': [_empty_cell() for _ in months],
+					'total': _empty_cell(),
+					'unpriced': 0,
+				}
+			for cell in (entry['cells'][index], entry['total']):
+				cell['quantity'] += row['quantity']
+				cell['cost'] += row['cost']
+			entry['unpriced'] += row['unpriced']
+
+	rows = sorted(table.values(), key=lambda entry: (departments[entry['office_key']].casefold(), entry['category']))
+	month_cells = [_empty_cell() for _ in months]
+	grand_total = _empty_cell()
+	for entry in rows:
+		entry['department'] = departments[entry['office_key']]
+		for cell, total in zip(entry['cells'], month_cells):
+			total['quantity'] += cell['quantity']
+			total['cost'] += cell['cost']
+		grand_total['quantity'] += entry['total']['quantity']
+		grand_total['cost'] += entry['total']['cost']
+	return {
+		'months': months,
+		'rows': rows,
+		'month_totals': month_cells,
+		'grand_total': grand_total,
+		'departments': sorted(departments.items(), key=lambda item: item[1].casefold()),
+	}
+
+
+def cross_tab_csv_rows(report):
+	header = ['Department', 'Category']
+	for month in report['months']:
+		header += [f'{month:%b %Y} Qty', f'{month:%b %Y} Cost']
+	header += ['Total Qty', 'Total Cost', 'Unpriced Lines']
+	yield header
+	for entry in report['rows']:
+		line = [entry['department'], entry['category']]
+		for cell in entry['cells']:
+			line += [cell['quantity'], f"{cell['cost']:.2f}"]
+		line += [entry['total']['quantity'], f"{entry['total']['cost']:.2f}", entry['unpriced']]
+		yield line
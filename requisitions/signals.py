@@ -0,0 +1,22 @@
+from django.db.models.signals import post_save
+from django.dispatch import Signal, receiver
+
+from .models import RequestEvent, SupplyRequest
+
+
+# Sent by views that change a request's status with QuerySet.update(), which
+# doesn't fire post_save: request_status_changed.send(SupplyRequest, request_id=..., status=...)
+request_status_changed = Signal()
+
+
+@receiver(post_save, sender=SupplyRequest, dispatch_uid='requisitions_request_saved')
+def request_saved(sender, instance, created, update_fields=None, **kwargs):
+	if not created and update_fields is not None and 'status' not in update_fields:
+		return
+	# Written in the saving transaction, so the feed never shows a rolled-back change
+	RequestEvent.objects.create(request_id=instance.pk, status=instance.status)
+
+
+@receiver(request_status_changed, sender=SupplyRequest, dispatch_uid='requisitions_request_status_changed')
+def request_status_updated(sender, request_id, status, **kwargs):
+	RequestEvent.objects.create(request_id=request_id, status=status)
@@ -0,0 +1,25 @@
+from django.tasks import task
+
+from .archive import archive_decided_requests
+from .events import prune_request_events
+from .receipts import approved_receipts_queryset, prerender_receipts
+
+
+@task
+def prerender_request_receipts(request_ids, force=False):
+	return prerender_receipts(approved_receipts_queryset().filter(pk__in=request_ids), force=force)
+
+
+@task(priority=-10)
+def prerender_all_receipts(force=False):
+	return prerender_receipts(force=force)
+
+
+@task(priority=-10)
+def archive_old_requests(days=None):
+	return archive_decided_requests(days)
+
+
+@task(priority=-10)
+def prune_old_request_events():
+	return prune_request_events()
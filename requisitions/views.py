@@ -1,33 +1,62 @@
+import csv
 from functools import wraps
 from datetime import date
+from itertools import groupby
+from operator import attrgetter
 from decimal import Decimal, InvalidOperation
 
+from asgiref.sync import iscoroutinefunction, sync_to_async
+
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.db import transaction
-from django.db.models import Q
+from django.db.models import Prefetch, Q
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.template.loader import render_to_string
 from django.utils import timezone
-
-from supplies.models import Supply
-from .models import SupplyRequest, SupplyRequestItem
-
-
-LOW_STOCK_THRESHOLD = 2
+from django.utils.safestring import mark_safe
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+
+from core.idempotency import idempotent
+from supplies.autocomplete import AUTOCOMPLETE_DEFAULT_LIMIT, autocomplete
+from supplies.catalog import get_catalog_page
+from supplies.conditional import catalog_projection_etag
+from supplies.models import Supply, SupplyFamily
+from supplies.stock import LOW_STOCK_THRESHOLD, default_horizon, get_projection, with_stock_position
+from supplies.versioning import STOCK_FIELDS, StaleSupplyError, save_supply_fields
+from .conditional import user_requests_etag, user_requests_last_modified
+from .events import event_stream, latest_event_id
+from .models import ArchivedSupplyRequest, SupplyRequest, SupplyRequestItem, normalize_office_key
+from .reports import cross_tab_csv_rows, department_cross_tab, parse_report_params
+from .receipts import get_or_render_receipt, load_receipt, render_receipt, store_receipt
+from .signals import request_status_changed
+from .tasks import prerender_request_receipts
 
 
 def staff_required(view_func):
-	@wraps(view_func)
-	def _wrapped(request, *args, **kwargs):
-		if not request.user.is_staff:
-			messages.error(request, 'Staff access required.')
-			return redirect('home')
-		return view_func(request, *args, **kwargs)
+	if iscoroutinefunction(view_func):
+		@wraps(view_func)
+		async def _wrapped(request, *args, **kwargs):
+			user = await request.auser()
+			if not user.is_staff:
+				messages.error(request, 'Staff access required.')
+				return redirect('home')
+			return await view_func(request, *args, **kwargs)
+	else:
+		@wraps(view_func)
+		def _wrapped(request, *args, **kwargs):
+			if not request.user.is_staff:
+				messages.error(request, 'Staff access required.')
+				return redirect('home')
+			return view_func(request, *args, **kwargs)
 
 	return login_required(_wrapped)
 
 
 @login_required
+@idempotent
 def request_create(request):
 	query = ''
 	selected_from_session = request.session.get('selected_supplies')
@@ -150,64 +179,66 @@ def request_create(request):
 
 
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=catalog_projection_etag)
 def select_supplies(request):
 	query = request.GET.get('q', '').strip()
 	selected_category = request.GET.get('category', '').strip()
-	supplies_qs = Supply.objects.all().order_by('name')
-	if query:
-		supplies_qs = supplies_qs.filter(
-			Q(name__icontains=query)
-			| Q(description__icontains=query)
-			| Q(size_spec__icontains=query)
-		)
-	if selected_category:
-		supplies_qs = supplies_qs.filter(category__iexact=selected_category)
-	supplies = list(supplies_qs)
-
-	# Group supplies by name so variants can be chosen via dropdown
-	name_groups = {}
-	for s in supplies:
-		name_groups.setdefault(s.name, []).append(s)
-	grouped_supplies = []
-	for name in sorted(name_groups.keys()):
-		variants = sorted(name_groups[name], key=lambda s: ((s.size_spec or '').lower(), s.id))
-		grouped_supplies.append({'name': name, 'variants': variants})
-
-	# Map for quick lookup by id during POST processing
-	supply_map = {str(s.id): s for s in supplies}
+	# One cached page of families; each row offers that family's variants
+	page = get_catalog_page(query, selected_category, request.GET.get('page') or 1)
 	categories = [choice[0] for choice in Supply.CATEGORY_CHOICES]
+	projection_horizon = default_horizon()
+	# Only this page's variants, so the page costs the same however large the catalog is
+	variant_ids = [variant.id for family in page for variant in family.catalog_variants]
+	projected = get_projection(projection_horizon, variant_ids)['units']
+	for family in page:
+		for variant in family.catalog_variants:
+			variant.projected_units = projected.get(variant.id)
+	params = request.GET.copy()
+	params.pop('page', None)
+	context = {
+		'page': page,
+		'query': query,
+		'categories': categories,
+		'selected_category': selected_category,
+		'low_stock_threshold': LOW_STOCK_THRESHOLD,
+		'projection_horizon': projection_horizon,
+		'querystring': params.urlencode(),
+	}
 
 	if request.method == 'POST':
-		context = {
-			'grouped_supplies': grouped_supplies,
-			'query': query,
-			'categories': categories,
-			'selected_category': selected_category,
-			'low_stock_threshold': LOW_STOCK_THRESHOLD,
-		}
+		# Rows are keyed by family id, so a POST doesn't depend on which page was shown
+		chosen = {}
+		for field in request.POST:
+			family_id = field.removeprefix('select_')
+			if field.startswith('select_') and family_id.isdigit() and request.POST.get(field):
+				chosen[int(family_id)] = request.POST.get(f'supply_choice_{family_id}', '').strip()
+		families = SupplyFamily.objects.in_bulk(chosen)
+		supplies = Supply.objects.in_bulk([int(pk) for pk in chosen.values() if pk.isdigit()])
 		selections = []
-		for idx, group in enumerate(grouped_supplies):
-			if not request.POST.get(f'select_{idx}'):
-				continue
-			selected_supply_id = request.POST.get(f'supply_choice_{idx}', '').strip()
+		for family_id, selected_supply_id in chosen.items():
+			family = families.get(family_id)
+			if family is None:
+				messages.error(request, 'One of the selected supplies is no longer available.')
+				return render(request, 'requisitions/select_supplies.html', context)
 			if not selected_supply_id:
-				messages.error(request, f'Choose a size/spec for {group["name"]}.')
+				messages.error(request, f'Choose a size/spec for {family.name}.')
 				return render(request, 'requisitions/select_supplies.html', context)
-			supply = supply_map.get(selected_supply_id)
-			if not supply:
-				messages.error(request, f'Invalid selection for {group["name"]}.')
+			supply = supplies.get(int(selected_supply_id)) if selected_supply_id.isdigit() else None
+			if not supply or supply.family_id != family_id:
+				messages.error(request, f'Invalid selection for {family.name}.')
 				return render(request, 'requisitions/select_supplies.html', context)
-			qty_str = request.POST.get(f'quantity_{idx}', '').strip()
+			qty_str = request.POST.get(f'quantity_{family_id}', '').strip()
 			if not qty_str:
-				messages.error(request, f'Quantity required for {group["name"]}.')
+				messages.error(request, f'Quantity required for {family.name}.')
 				return render(request, 'requisitions/select_supplies.html', context)
 			try:
 				qty = int(qty_str)
 			except ValueError:
-				messages.error(request, f'Invalid quantity for {group["name"]}.')
+				messages.error(request, f'Invalid quantity for {family.name}.')
 				return render(request, 'requisitions/select_supplies.html', context)
 			if qty <= 0:
-				messages.error(request, f'Quantity for {group["name"]} must be greater than zero.')
+				messages.error(request, f'Quantity for {family.name} must be greater than zero.')
 				return render(request, 'requisitions/select_supplies.html', context)
 			available = supply.boxes_count if supply.unit in ('pack', 'ream') else supply.quantity
 			if qty > available:
@@ -219,17 +250,23 @@ def select_supplies(request):
 			messages.error(request, 'Please select at least one supply (check the box, pick a size/spec, and enter quantity).')
 			return render(request, 'requisitions/select_supplies.html', context)
 
-		request.session['selected_supplies'] = selections
+		# Selections from other pages (or earlier visits) are kept; a re-picked supply takes the new quantity
+		merged = {item['supply_id']: item for item in request.session.get('selected_supplies') or []}
+		merged.update((item['supply_id'], item) for item in selections)
+		request.session['selected_supplies'] = list(merged.values())
 		messages.success(request, 'Items added. Continue to fill the request form.')
 		return redirect('request_create')
 
-	return render(request, 'requisitions/select_supplies.html', {
-		'grouped_supplies': grouped_supplies,
-		'query': query,
-		'categories': categories,
-		'selected_category': selected_category,
-		'low_stock_threshold': LOW_STOCK_THRESHOLD,
-	})
+	return render(request, 'requisitions/select_supplies.html', context)
+
+
+@login_required
+def supply_autocomplete(request):
+	try:
+		limit = int(request.GET.get('limit', AUTOCOMPLETE_DEFAULT_LIMIT))
+	except ValueError:
+		limit = AUTOCOMPLETE_DEFAULT_LIMIT
+	return JsonResponse({'results': autocomplete(request.GET.get('q', ''), limit)})
 
 
 @login_required
@@ -241,6 +278,8 @@ def request_list(request):
 	approved = [r for r in qs if r.status == SupplyRequest.STATUS_APPROVED]
 	rejected = [r for r in qs if r.status == SupplyRequest.STATUS_REJECTED]
 	return render(request, 'requisitions/request_list.html', {
+		# Read before the rows are rendered, so the live feed can't skip a change in between
+		'last_event_id': latest_event_id() if request.user.is_staff else None,
 		'all_requests': qs,
 		'pending_requests': pending,
 		'approved_requests': approved,
@@ -248,6 +287,55 @@ def request_list(request):
 	})
 
 
+@staff_required
+async def request_events(request):
+	# Server-Sent Events feed of new and decided requests; serve it over ASGI
+	after = request.headers.get('Last-Event-ID') or request.GET.get('after')
+	try:
+		after = int(after)
+	except (TypeError, ValueError):
+		after = await sync_to_async(latest_event_id)()
+	response = StreamingHttpResponse(
+		event_stream(request, after, include_rows=request.GET.get('rows') == '1'),
+		content_type='text/event-stream',
+	)
+	response['Cache-Control'] = 'no-cache'
+	# Stop nginx-style proxies from buffering the stream
+	response['X-Accel-Buffering'] = 'no'
+	return response
+
+
+@staff_required
+def department_report(request):
+	try:
+		params = parse_report_params(request.GET)
+	except ValueError as exc:
+		messages.error(request, str(exc))
+		return redirect('department_report')
+	report = department_cross_tab(params['start'], params['end'], params['office_key'])
+
+	if request.GET.get('format') == 'csv':
+		response = HttpResponse(content_type='text/csv')
+		response['Content-Disposition'] = f'attachment; filename="department-report-{params["start"]:%Y%m}-{params["end"]:%Y%m}.csv"'
+		csv.writer(response).writerows(cross_tab_csv_rows(report))
+		return response
+
+	querystring = request.GET.copy()
+	querystring['format'] = 'csv'
+	return render(request, 'requisitions/department_report.html', {
+		'report': report,
+		'start': params['start'],
+		'end': params['end'],
+		'selected_department': params['office_key'],
+		'csv_querystring': querystring.urlencode(),
+	})
+
+
+def _include_archive(request):
+	# Archived requests live in their own table and are only read when asked for
+	return request.GET.get('include_archive') == '1'
+
+
 @staff_required
 def request_history(request):
 	qs = (
@@ -255,8 +343,12 @@ def request_history(request):
 		.prefetch_related('items__supply')
 		.order_by('user__username', '-requested_at')
 	)
+	requests = list(qs)
+	include_archive = _include_archive(request)
+	if include_archive:
+		requests += ArchivedSupplyRequest.objects.select_related('user', 'decided_by')
 	grouped = {}
-	for req in qs:
+	for req in requests:
 		user = req.user
 		uid = user.id
 		if uid not in grouped:
@@ -271,12 +363,17 @@ def request_history(request):
 	user_groups = sorted(grouped.values(), key=lambda g: g['display_name'].lower())
 	for group in user_groups:
 		group['total_requests'] = len(group['requests'])
+		if include_archive:
+			group['requests'].sort(key=attrgetter('requested_at'), reverse=True)
 	return render(request, 'requisitions/request_history.html', {
 		'user_groups': user_groups,
+		'include_archive': include_archive,
 	})
 
 
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=user_requests_etag, last_modified_func=user_requests_last_modified)
 def request_history_user(request):
 	qs = (
 		SupplyRequest.objects.filter(user=request.user)
@@ -284,13 +381,19 @@ def request_history_user(request):
 		.prefetch_related('items__supply')
 		.order_by('-requested_at')
 	)
+	requests = list(qs)
+	include_archive = _include_archive(request)
+	if include_archive:
+		requests += ArchivedSupplyRequest.objects.filter(user=request.user).select_related('decided_by')
+		requests.sort(key=attrgetter('requested_at'), reverse=True)
 	counts = {'pending': 0, 'approved': 0, 'rejected': 0}
-	for r in qs:
+	for r in requests:
 		if r.status in counts:
 			counts[r.status] += 1
 	return render(request, 'requisitions/request_history_user.html', {
-		'requests': qs,
+		'requests': requests,
 		'counts': counts,
+		'include_archive': include_archive,
 	})
 
 
@@ -311,84 +414,187 @@ def archive_request(request, pk):
 	return redirect('request_list')
 
 
+def _parse_horizon(raw, supply_request):
+	try:
+		return date.fromisoformat(raw.strip())
+	except ValueError:
+		pass
+	# Default to when the requester needs the items, but look at least a couple of weeks ahead
+	return max(filter(None, (supply_request.date_needed, default_horizon())))
+
+
 @staff_required
 def request_detail(request, pk):
-	supply_request = get_object_or_404(
-		SupplyRequest.objects.select_related('user').prefetch_related('items__supply'), pk=pk
-	)
-	items = list(supply_request.items.select_related('supply'))
+	supply_request = get_object_or_404(SupplyRequest.objects.select_related('user', 'decided_by'), pk=pk)
+	horizon = _parse_horizon(request.GET.get('horizon', ''), supply_request)
+	# Each supply arrives with its on-hand, incoming and projected stock from one annotated query
+	items = list(supply_request.items.prefetch_related(
+		Prefetch('supply', queryset=with_stock_position(Supply.all_objects.all(), horizon))
+	))
 	shortages = []
+	covered_count = 0
 	for item in items:
 		supply = item.supply
-		available = supply.boxes_count if supply.unit in ('pack', 'ream') else supply.quantity
+		available = supply.on_hand
 		item.available_stock = available
 		item.is_shortage = item.quantity > available
+		# Short today, but deliveries due by the horizon cover every pending request
+		item.is_covered = item.is_shortage and supply.projected_units >= 0
 		if item.is_shortage:
 			shortages.append({'name': supply.name, 'requested': item.quantity, 'available': available, 'unit': supply.unit})
+		if item.is_covered:
+			covered_count += 1
 	return render(request, 'requisitions/request_detail.html', {
 		'req': supply_request,
 		'items': items,
 		'shortages': shortages,
+		'covered_count': covered_count,
+		'horizon': horizon,
 	})
 
 
 @login_required
 def request_receipt(request, pk):
-	req = get_object_or_404(
-		SupplyRequest.objects.select_related('user', 'decided_by').prefetch_related('items__supply'), pk=pk
-	)
-	if (not request.user.is_staff) and req.user != request.user:
+	# Only the fields needed for access checks and the cache key; the full request loads on a miss
+	receipt_fields = ('id', 'user_id', 'status', 'decision_at')
+	model = SupplyRequest
+	req = SupplyRequest.objects.only(*receipt_fields).filter(pk=pk).first()
+	if req is None:
+		model = ArchivedSupplyRequest
+		req = get_object_or_404(ArchivedSupplyRequest.objects.only(*receipt_fields), pk=pk)
+	if (not request.user.is_staff) and req.user_id != request.user.id:
 		messages.error(request, 'You do not have access to this receipt.')
 		return redirect('request_list')
 	if req.status != SupplyRequest.STATUS_APPROVED:
 		messages.error(request, 'Receipt is available only after approval.')
 		return redirect('request_list')
-	items = list(req.items.select_related('supply'))
+	receipt_body = load_receipt(req)
+	if receipt_body is None:
+		req = model.objects.select_related('user', 'decided_by').get(pk=pk)
+		receipt_body = render_receipt(req, req.line_items if model is ArchivedSupplyRequest else None)
+		store_receipt(req, receipt_body)
 	return render(request, 'requisitions/request_receipt.html', {
 		'req': req,
-		'items': items,
+		'receipt_body': mark_safe(receipt_body),
+		'generated_at': timezone.now(),
+	})
+
+
+def _parse_batch_filters(params):
+	filters = Q(status=SupplyRequest.STATUS_APPROVED)
+	start_raw = params.get('start', '').strip()
+	end_raw = params.get('end', '').strip()
+	department = params.get('department', '').strip()
+	ids_raw = params.get('ids', '').strip()
+	if ids_raw:
+		ids = [int(part) for part in ids_raw.replace(' ', ',').split(',') if part]
+		filters &= Q(pk__in=ids)
+	if start_raw:
+		filters &= Q(decision_at__date__gte=date.fromisoformat(start_raw))
+	if end_raw:
+		filters &= Q(decision_at__date__lte=date.fromisoformat(end_raw))
+	if department:
+		# Same matching as the department report: "L.G.C.D." and "lgcd" are one office
+		filters &= Q(office_key=normalize_office_key(department))
+	if not (ids_raw or start_raw or end_raw or department):
+		# Default to the receipts approved today
+		filters &= Q(decision_at__date=timezone.localdate())
+	return filters
+
+
+def _batch_receipt_stream(requests, items):
+	yield render_to_string('requisitions/receipt_batch_start.html', {
+		'total': len(requests),
 		'generated_at': timezone.now(),
 	})
+	# Items arrive ordered by request id, matching the request order
+	groups = groupby(items, key=attrgetter('request_id'))
+	current = next(groups, None)
+	for req in requests:
+		while current is not None and current[0] < req.pk:
+			current = next(groups, None)
+		req_items = []
+		if current is not None and current[0] == req.pk:
+			req_items = list(current[1])
+			current = next(groups, None)
+		yield '<section class="receipt receipt-page">'
+		yield get_or_render_receipt(req, req_items)
+		yield '</section>\n'
+	yield '</div>\n</body>\n</html>\n'
+
+
+@staff_required
+def request_receipt_batch(request):
+	try:
+		filters = _parse_batch_filters(request.GET)
+	except ValueError:
+		messages.error(request, 'Invalid receipt filters. Use YYYY-MM-DD dates and numeric request IDs.')
+		return redirect('request_list')
+	base_qs = SupplyRequest.objects.filter(filters)
+	# Two queries: the requests up front, then their items streamed in request order
+	requests = list(base_qs.select_related('user', 'decided_by').order_by('pk'))
+	items = (
+		SupplyRequestItem.objects.filter(request__in=base_qs.values('pk'))
+		.select_related('supply')
+		.order_by('request_id', 'pk')
+		.iterator(chunk_size=500)
+	)
+	return StreamingHttpResponse(_batch_receipt_stream(requests, items), content_type='text/html; charset=utf-8')
 
 
 @staff_required
+@idempotent
 def approve_request(request, pk):
 	if request.method != 'POST':
 		return redirect('request_list')
-	supply_request = get_object_or_404(
-		SupplyRequest.objects.select_related('user').prefetch_related('items__supply'), pk=pk
-	)
+	supply_request = get_object_or_404(SupplyRequest, pk=pk)
 	if supply_request.status != SupplyRequest.STATUS_PENDING:
 		messages.info(request, 'Request already processed.')
 		return redirect('request_list')
 
-	with transaction.atomic():
-		for item in supply_request.items.select_related('supply'):
-			supply = item.supply
-			available = supply.boxes_count if supply.unit in ('pack', 'ream') else supply.quantity
-			if item.quantity > available:
-				messages.error(request, f'Cannot approve: {supply.name} is low on stock (requested {item.quantity}, available {available}).')
-				return redirect('request_list')
-
-		for item in supply_request.items.select_related('supply'):
-			supply = item.supply
-			if supply.unit in ('pack', 'ream'):
-				supply.boxes_count = max(0, supply.boxes_count - item.quantity)
-				supply.quantity = supply.boxes_count
-			else:
-				supply.quantity = supply.quantity - item.quantity
-			supply.save()
+	items = list(supply_request.items.select_related('supply'))
+	for item in items:
+		supply = item.supply
+		available = supply.boxes_count if supply.unit in ('pack', 'ream') else supply.quantity
+		if item.quantity > available:
+			messages.error(request, f'Cannot approve: {supply.name} is low on stock (requested {item.quantity}, available {available}).')
+			return redirect('request_list')
 
-		supply_request.status = SupplyRequest.STATUS_APPROVED
-		supply_request.decided_by = request.user
-		supply_request.decision_at = timezone.now()
-		supply_request.save()
+	try:
+		with transaction.atomic():
+			# Only one approval or rejection can move the request out of pending
+			decided = SupplyRequest.objects.filter(pk=supply_request.pk, status=SupplyRequest.STATUS_PENDING).update(
+				status=SupplyRequest.STATUS_APPROVED, decided_by=request.user, decision_at=timezone.now()
+			)
+			if not decided:
+				messages.info(request, 'Request already processed.')
+				return redirect('request_list')
+			request_status_changed.send(SupplyRequest, request_id=supply_request.pk, status=SupplyRequest.STATUS_APPROVED)
+
+			for item in items:
+				supply = item.supply
+				if supply.unit in ('pack', 'ream'):
+					supply.boxes_count = max(0, supply.boxes_count - item.quantity)
+					supply.quantity = supply.boxes_count
+					fields = STOCK_FIELDS
+				else:
+					supply.quantity = supply.quantity - item.quantity
+					fields = ['quantity']
+				# Fails if the stock checked above moved in the meantime
+				save_supply_fields(supply, fields)
+
+			# Queued in the same transaction, so a rolled-back approval never renders
+			prerender_request_receipts.enqueue([supply_request.pk])
+	except StaleSupplyError as exc:
+		messages.error(request, f'Cannot approve: stock for {exc.supply.name} changed while approving. Please review and try again.')
+		return redirect('request_list')
 
 	messages.success(request, 'Request approved and stock deducted.')
 	return redirect('request_list')
 
 
 @staff_required
+@idempotent
 def reject_request(request, pk):
 	if request.method != 'POST':
 		return redirect('request_list')
@@ -397,10 +603,15 @@ def reject_request(request, pk):
 		messages.info(request, 'Request already processed.')
 		return redirect('request_list')
 
-	supply_request.status = SupplyRequest.STATUS_REJECTED
-	supply_request.decided_by = request.user
-	supply_request.decision_at = timezone.now()
-	supply_request.save()
+	with transaction.atomic():
+		decided = SupplyRequest.objects.filter(pk=supply_request.pk, status=SupplyRequest.STATUS_PENDING).update(
+			status=SupplyRequest.STATUS_REJECTED, decided_by=request.user, decision_at=timezone.now()
+		)
+		if decided:
+			request_status_changed.send(SupplyRequest, request_id=supply_request.pk, status=SupplyRequest.STATUS_REJECTED)
+	if not decided:
+		messages.info(request, 'Request already processed.')
+		return redirect('request_list')
 	messages.success(request, 'Request rejected.')
 	return redirect('request_list')
 
@@ -0,0 +1,162 @@
+from datetime import date, datetime, time, timedelta
+
+from django.core.cache import cache
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from requisitions.models import SupplyRequest, SupplyRequestItem
+
+from .catalog import get_catalog_version
+from .models import Supply
+
+
+ANALYTICS_CACHE_TIMEOUT = 60
+ANALYTICS_MAX_GROUPS = 8
+
+GRANULARITIES = {
+	'month': (TruncMonth, '%b %Y'),
+	'week': (TruncWeek, '%d %b %Y'),
+	'day': (TruncDay, '%Y-%m-%d'),
+}
+
+GROUPINGS = {
+	'supply': 'supply__name',
+	'category': 'supply__category',
+	'department': 'request__department',
+}
+
+
+def parse_analytics_params(params):
+	granularity = params.get('granularity', 'month').strip() or 'month'
+	group_by = params.get('group_by', '').strip()
+	if granularity not in GRANULARITIES:
+		raise ValueError(f'Unknown granularity "{granularity}".')
+	if group_by and group_by not in GROUPINGS:
+		raise ValueError(f'Unknown grouping "{group_by}".')
+	start_raw = params.get('start', '').strip()
+	end_raw = params.get('end', '').strip()
+	start = date.fromisoformat(start_raw) if start_raw else None
+	end = date.fromisoformat(end_raw) if end_raw else None
+	if start and end and start > end:
+		raise ValueError('Start date must be on or before the end date.')
+	return {'start': start, 'end': end, 'granularity': granularity, 'group_by': group_by}
+
+
+def _day_start(day):
+	return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def approved_items(start=None, end=None):
+	qs = SupplyRequestItem.objects.filter(request__status=SupplyRequest.STATUS_APPROVED)
+	# Bound the raw timestamp rather than its date so the (status, requested_at) index applies
+	if start:
+		qs = qs.filter(request__requested_at__gte=_day_start(start))
+	if end:
+		qs = qs.filter(request__requested_at__lt=_day_start(end + timedelta(days=1)))
+	return qs
+
+
+def outgoing_series(start=None, end=None, granularity='month', group_by=''):
+	trunc, label_format = GRANULARITIES[granularity]
+	qs = approved_items(start, end).annotate(period=trunc('request__requested_at'))
+
+	if not group_by:
+		rows = qs.values('period').annotate(total=Sum('quantity')).order_by('period')
+		rows = [row for row in rows if row['period']]
+		return {
+			'labels': [row['period'].strftime(label_format) for row in rows],
+			'series': [{'label': 'Outgoing quantity', 'data': [row['total'] for row in rows]}],
+			'totals': [],
+		}
+
+	field = GROUPINGS[group_by]
+	rows = qs.values('period', field).annotate(total=Sum('quantity')).order_by('period')
+	periods = []
+	by_group = {}
+	for row in rows:
+		period = row['period']
+		if not period:
+			continue
+		if not periods or periods[-1] != period:
+			periods.append(period)
+		group = row[field] or 'Unspecified'
+		group_values = by_group.setdefault(group, {})
+		group_values[period] = group_values.get(period, 0) + row['total']
+
+	totals = sorted(
+		((group, sum(values.values())) for group, values in by_group.items()),
+		key=lambda entry: (-entry[1], entry[0]),
+	)
+	# Keep the chart readable: the largest groups get their own line, the rest fold into "Other"
+	shown = [group for group, _ in totals[:ANALYTICS_MAX_GROUPS]]
+	series = [{'label': group, 'data': [by_group[group].get(p, 0) for p in periods]} for group in shown]
+	rest = [group for group, _ in totals[ANALYTICS_MAX_GROUPS:]]
+	if rest:
+		series.append({
+			'label': 'Other',
+			'data': [sum(by_group[group].get(p, 0) for group in rest) for p in periods],
+		})
+	return {
+		'labels': [p.strftime(label_format) for p in periods],
+		'series': series,
+		'totals': [{'label': group, 'total': total} for group, total in totals],
+	}
+
+
+def get_outgoing_series(start=None, end=None, granularity='month', group_by=''):
+	# Approvals save Supply rows, so the catalog version also retires stale series
+	key = f'supplies:analytics:outgoing:{get_catalog_version()}:{start}:{end}:{granularity}:{group_by}'
+	data = cache.get(key)
+	if data is None:
+		data = outgoing_series(start, end, granularity, group_by)
+		data.update({
+			'start': start.isoformat() if start else None,
+			'end': end.isoformat() if end else None,
+			'granularity': granularity,
+			'group_by': group_by,
+		})
+		cache.set(key, data, ANALYTICS_CACHE_TIMEOUT)
+	return data
+
+
+def get_outgoing_summary(start=None, end=None):
+	key = f'supplies:analytics:summary:{get_catalog_version()}:{start}:{end}'
+	data = cache.get(key)
+	if data is None:
+		data = approved_items(start, end).aggregate(
+			total_quantity=Sum('quantity'),
+			approved_requests=Count('request', distinct=True),
+		)
+		data['total_quantity'] = data['total_quantity'] or 0
+		cache.set(key, data, ANALYTICS_CACHE_TIMEOUT)
+	return data
+
+
+# Independent dashboard aggregates; the async dashboard runs them side by side
+
+def stock_totals():
+	totals = Supply.objects.aggregate(total_supplies=Count('id'), total_quantity=Sum('quantity'))
+	totals['total_quantity'] = totals['total_quantity'] or 0
+	return totals
+
+
+def low_stock_supplies(threshold):
+	return list(Supply.objects.filter(quantity__gt=0, quantity__lte=threshold).order_by('quantity', 'name'))
+
+
+def no_stock_supplies():
+	return list(Supply.objects.filter(quantity__lte=0).order_by('name'))
+
+
+def pending_requests_count():
+	return SupplyRequest.objects.filter(status=SupplyRequest.STATUS_PENDING, is_archived=False).count()
+
+
+def top_requested(limit=5):
+	return list(
+		SupplyRequestItem.objects.filter(request__status=SupplyRequest.STATUS_APPROVED)
+		.values('supply__name')
+		.annotate(total=Sum('quantity'))
+		.order_by('-total')[:limit]
+	)
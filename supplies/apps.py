@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class SuppliesConfig(AppConfig):
     name = 'supplies'
+
+    def ready(self):
+        from . import signals  # noqa: F401
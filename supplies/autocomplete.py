@@ -0,0 +1,114 @@
+import heapq
+import re
+import threading
+from bisect import bisect_left, bisect_right
+
+from .catalog import get_catalog_version
+from .models import Supply
+from .stock import LOW_STOCK_THRESHOLD
+
+
+AUTOCOMPLETE_DEFAULT_LIMIT = 8
+AUTOCOMPLETE_MAX_LIMIT = 20
+# Prefixes this short match thousands of distinct tokens, so their hits are precomputed
+SHORT_PREFIX_LENGTH = 2
+
+_index = None
+_index_version = None
+_index_lock = threading.Lock()
+
+
+def tokenize(text):
+	return re.sub(r'[^0-9a-z]+', ' ', (text or '').casefold()).split()
+
+
+class PrefixIndex:
+	# Sorted (token, rank) postings over name and size/spec words. Supplies are ranked
+	# in-stock first, then by name, so the first hits in rank order are the best ones.
+	def __init__(self, rows):
+		self.rows = sorted(rows, key=lambda row: (row['available'] <= 0, row['name'].casefold(), row['size_spec'].casefold()))
+		self.row_tokens = [tuple(set(tokenize(row['name']) + tokenize(row['size_spec']))) for row in self.rows]
+		postings = sorted((token, rank) for rank, tokens in enumerate(self.row_tokens) for token in tokens)
+		self.keys = [token for token, rank in postings]
+		self.ranks = [rank for token, rank in postings]
+		short = {}
+		for token, rank in postings:
+			for length in range(1, SHORT_PREFIX_LENGTH + 1):
+				short.setdefault(token[:length], set()).add(rank)
+		self.short = {prefix: sorted(ranks) for prefix, ranks in short.items()}
+
+	def _range(self, prefix):
+		lo = bisect_left(self.keys, prefix)
+		return lo, bisect_left(self.keys, prefix + '\uffff', lo)
+
+	def _hit_count(self, prefix):
+		if len(prefix) <= SHORT_PREFIX_LENGTH:
+			return len(self.short.get(prefix, ()))
+		lo, hi = self._range(prefix)
+		return hi - lo
+
+	def _ranks_for(self, prefix):
+		if len(prefix) <= SHORT_PREFIX_LENGTH:
+			return iter(self.short.get(prefix, ()))
+		# One ascending run per distinct token starting with the prefix, merged lazily
+		lo, hi = self._range(prefix)
+		runs = []
+		while lo < hi:
+			end = bisect_right(self.keys, self.keys[lo], lo, hi)
+			runs.append(self.ranks[k] for k in range(lo, end))
+			lo = end
+		return heapq.merge(*runs)
+
+	def search(self, query, limit=AUTOCOMPLETE_DEFAULT_LIMIT):
+		terms = tokenize(query)
+		if not terms:
+			return []
+		# Walk the hits of the most selective word in rank order, check the rest per supply
+		lead = min(terms, key=self._hit_count)
+		others = [term for term in terms if term != lead]
+		results = []
+		seen = set()
+		for rank in self._ranks_for(lead):
+			if rank in seen:
+				continue
+			seen.add(rank)
+			tokens = self.row_tokens[rank]
+			if all(any(token.startswith(term) for token in tokens) for term in others):
+				results.append(self.rows[rank])
+				if len(results) >= limit:
+					break
+		return results
+
+
+def build_index():
+	rows = []
+	for pk, name, size_spec, unit, quantity, boxes_count, family_id in Supply.objects.values_list(
+		'pk', 'name', 'size_spec', 'unit', 'quantity', 'boxes_count', 'family_id'
+	).iterator(chunk_size=5000):
+		available = boxes_count if unit in ('pack', 'ream') else quantity
+		rows.append({
+			'id': pk,
+			'name': name,
+			'size_spec': size_spec,
+			'unit': unit,
+			'available': available,
+			'stock': 'out' if available <= 0 else 'low' if available <= LOW_STOCK_THRESHOLD else 'available',
+			'family_id': family_id,
+		})
+	return PrefixIndex(rows)
+
+
+def get_index():
+	# One index per process, rebuilt when any supply write bumps the catalog version
+	global _index, _index_version
+	version = get_catalog_version()
+	if _index_version != version:
+		with _index_lock:
+			if _index_version != version:
+				_index = build_index()
+				_index_version = version
+	return _index
+
+
+def autocomplete(query, limit=AUTOCOMPLETE_DEFAULT_LIMIT):
+	return get_index().search(query, max(1, min(limit, AUTOCOMPLETE_MAX_LIMIT)))
@@ -0,0 +1,68 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.core.paginator import Page, Paginator
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Prefetch, Q
+
+from .models import Supply, SupplyFamily
+
+
+CATALOG_VERSION_KEY = 'supplies:catalog:version'
+CATALOG_SNAPSHOT_TIMEOUT = 60 * 60
+CATALOG_PAGE_SIZE = 50
+
+
+def get_catalog_version():
+	version = cache.get(CATALOG_VERSION_KEY)
+	if version is None:
+		# Seed with a timestamp so a lost key never reuses an older snapshot key
+		cache.add(CATALOG_VERSION_KEY, time.time_ns(), None)
+		version = cache.get(CATALOG_VERSION_KEY)
+	return version
+
+
+def _bump():
+	try:
+		cache.incr(CATALOG_VERSION_KEY)
+	except ValueError:
+		cache.set(CATALOG_VERSION_KEY, time.time_ns(), None)
+
+
+def bump_catalog_version():
+	# Bump after commit so no reader can cache pre-commit rows under the new version
+	transaction.on_commit(_bump)
+
+
+def catalog_variants(query='', category=''):
+	variants = Supply.objects.all()
+	if category:
+		variants = variants.filter(category__iexact=category)
+	if query:
+		variants = variants.filter(Q(name__icontains=query) | Q(description__icontains=query) | Q(size_spec__icontains=query))
+	return variants
+
+
+def build_catalog_page(query='', category='', number=1):
+	# One page of families, each with its matching variants prefetched in one more query
+	variants = catalog_variants(query, category)
+	families = SupplyFamily.objects.filter(Exists(variants.filter(family=OuterRef('pk')))).order_by('name', 'pk')
+	paginator = Paginator(families, CATALOG_PAGE_SIZE)
+	page = paginator.get_page(number)
+	rows = list(page.object_list.prefetch_related(
+		Prefetch('variants', queryset=variants.order_by('size_spec', 'pk'), to_attr='catalog_variants')
+	))
+	return {'families': rows, 'number': page.number, 'count': paginator.count}
+
+
+def get_catalog_page(query='', category='', number=1):
+	# Cached per page and filter under the catalog version, so any supply write retires them all
+	params = hashlib.sha1(f'{query.casefold()}|{category.casefold()}|{number}'.encode()).hexdigest()
+	key = f'supplies:catalog:page:{get_catalog_version()}:{params}'
+	data = cache.get(key)
+	if data is None:
+		data = build_catalog_page(query, category, number)
+		cache.set(key, data, CATALOG_SNAPSHOT_TIMEOUT)
+	paginator = Paginator(range(data['count']), CATALOG_PAGE_SIZE)
+	return Page(data['families'], data['number'], paginator)
@@ -0,0 +1,145 @@
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from requisitions.models import ArchivedSupplyRequest, SupplyRequest, SupplyRequestItem
+
+from .models import CountLine, CountSession, IncomingSupply, StockCheckpoint, StockCheckpointBalance, Supply
+from .stock import available_units
+
+
+# Historical stock = the nearest checkpoint plus or minus the movements between it
+# and the requested instant. Live stock acts as a checkpoint taken "now", so the
+# first checkpoint can be computed by walking back from current balances.
+# Movements are counted in available units, like everywhere else in supplies.stock.
+
+
+def day_end(day):
+	# "As of December 31" means after everything that happened on that day
+	return timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+
+
+def last_month_end(today=None):
+	today = today or timezone.localdate()
+	return today.replace(day=1) - timedelta(days=1)
+
+
+def _only(queryset, supply_ids, field='supply_id'):
+	return queryset if supply_ids is None else queryset.filter(**{f'{field}__in': supply_ids})
+
+
+def movement_totals(start, end, supply_ids=None):
+	# Net units per supply from movements with start <= timestamp < end
+	totals = {}
+	received = (
+		_only(IncomingSupply.objects.filter(status=IncomingSupply.STATUS_RECEIVED, received_at__gte=start, received_at__lt=end), supply_ids)
+		.values('supply')
+		.annotate(total=Sum('quantity'))
+		.order_by()
+	)
+	for row in received:
+		totals[row['supply']] = totals.get(row['supply'], 0) + row['total']
+	# Stock leaves at approval; legacy rows without a decision time use the request time
+	issued = (
+		_only(SupplyRequestItem.objects.filter(request__status=SupplyRequest.STATUS_APPROVED), supply_ids)
+		.filter(
+			Q(request__decision_at__gte=start, request__decision_at__lt=end)
+			| Q(request__decision_at__isnull=True, request__requested_at__gte=start, request__requested_at__lt=end)
+		)
+		.values('supply')
+		.annotate(total=Sum('quantity'))
+		.order_by()
+	)
+	for row in issued:
+		totals[row['supply']] = totals.get(row['supply'], 0) - row['total']
+	# Archiving moves old decided requests out of SupplyRequestItem; their items live on as JSON
+	archived = ArchivedSupplyRequest.objects.filter(status=SupplyRequest.STATUS_APPROVED).filter(
+		Q(decision_at__gte=start, decision_at__lt=end)
+		| Q(decision_at__isnull=True, requested_at__gte=start, requested_at__lt=end)
+	)
+	wanted = None if supply_ids is None else set(supply_ids)
+	for items in archived.values_list('items', flat=True).iterator(chunk_size=500):
+		for item in items:
+			if wanted is None or item['supply_id'] in wanted:
+				totals[item['supply_id']] = totals.get(item['supply_id'], 0) - item['quantity']
+	# Applied stock counts moved each supply by its recorded variance
+	counted = (
+		_only(CountLine.objects.filter(session__status=CountSession.STATUS_APPLIED, session__applied_at__gte=start, session__applied_at__lt=end), supply_ids)
+		.exclude(variance=0)
+		.values('supply')
+		.annotate(total=Sum('variance'))
+		.order_by()
+	)
+	for row in counted:
+		totals[row['supply']] = totals.get(row['supply'], 0) + row['total']
+	return totals
+
+
+def live_units(supply_ids=None):
+	return dict(_only(Supply.all_objects.all(), supply_ids, 'pk').annotate(units=available_units()).values_list('pk', 'units'))
+
+
+def checkpoint_units(checkpoint, supply_ids=None):
+	return dict(_only(checkpoint.balances.all(), supply_ids).values_list('supply_id', 'units'))
+
+
+def _nearest_base(moment, exclude_exact=False):
+	# Whichever known balance is closest in time: fewest movements to apply
+	before = StockCheckpoint.objects.filter(as_of__lt=moment) if exclude_exact else StockCheckpoint.objects.filter(as_of__lte=moment)
+	before = before.order_by('-as_of').first()
+	after = StockCheckpoint.objects.filter(as_of__gt=moment).order_by('as_of').first()
+	now = timezone.now()
+	candidates = [(now - moment, None)]
+	if before:
+		candidates.append((moment - before.as_of, before))
+	if after:
+		candidates.append((after.as_of - moment, after))
+	gap, checkpoint = min(candidates, key=lambda candidate: candidate[0])
+	return checkpoint, checkpoint.as_of if checkpoint else now
+
+
+def stock_as_of(moment, supply_ids=None, exclude_exact=False):
+	# Returns {supply_id: units} and the checkpoint it started from (None: live stock)
+	moment = min(moment, timezone.now())
+	checkpoint, base_time = _nearest_base(moment, exclude_exact)
+	units = checkpoint_units(checkpoint, supply_ids) if checkpoint else live_units(supply_ids)
+	if base_time <= moment:
+		delta, sign = movement_totals(base_time, moment, supply_ids), 1
+	else:
+		delta, sign = movement_totals(moment, base_time, supply_ids), -1
+	for supply_id, change in delta.items():
+		units[supply_id] = units.get(supply_id, 0) + sign * change
+	if checkpoint and base_time <= moment:
+		# Supplies added after the checkpoint have no balance row; walk back from live stock instead
+		added = list(_only(Supply.all_objects.filter(created_at__gte=base_time, created_at__lt=moment), supply_ids, 'pk').values_list('pk', flat=True))
+		if added:
+			added_units = live_units(added)
+			for supply_id, change in movement_totals(moment, timezone.now(), added).items():
+				added_units[supply_id] = added_units.get(supply_id, 0) - change
+			units.update(added_units)
+	# Supplies added later didn't exist yet
+	for supply_id in _only(Supply.all_objects.filter(created_at__gte=moment), supply_ids, 'pk').values_list('pk', flat=True):
+		units.pop(supply_id, None)
+	return units, checkpoint
+
+
+def create_checkpoint(as_of, batch_size=1000):
+	# Recreating a checkpoint recomputes it from its neighbours, never from itself
+	units, _ = stock_as_of(as_of, exclude_exact=True)
+	with transaction.atomic():
+		checkpoint, created = StockCheckpoint.objects.get_or_create(as_of=as_of)
+		if not created:
+			checkpoint.balances.all().delete()
+			checkpoint.created_at = timezone.now()
+			checkpoint.save(update_fields=['created_at'])
+		StockCheckpointBalance.objects.bulk_create(
+			[StockCheckpointBalance(checkpoint=checkpoint, supply_id=pk, units=value) for pk, value in units.items()],
+			batch_size=batch_size,
+		)
+	return checkpoint, len(units)
+
+
+def create_month_end_checkpoint(today=None):
+	return create_checkpoint(day_end(last_month_end(today)))
@@ -0,0 +1,36 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+
+from .catalog import get_catalog_version
+from .stock import projection_stamp
+
+
+def has_pending_messages(request):
+	# Reading the length does not mark messages as used, so they still render on the next full page
+	return len(get_messages(request)) > 0
+
+
+def make_etag(request, *parts):
+	# Pages embed the user, the query string and a CSRF token, so all of them feed the tag
+	raw = '|'.join(str(part) for part in (
+		request.user.pk,
+		request.get_full_path(),
+		request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+		*parts,
+	))
+	return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def catalog_etag(request, *args, **kwargs):
+	if has_pending_messages(request):
+		return None
+	return make_etag(request, 'catalog', get_catalog_version())
+
+
+def catalog_projection_etag(request, *args, **kwargs):
+	# For pages that also show projected stock, which changes without a catalog bump
+	if has_pending_messages(request):
+		return None
+	return make_etag(request, 'catalog', projection_stamp())
@@ -0,0 +1,169 @@
+import csv
+import io
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Case, F, OuterRef, Q, Subquery, When
+from django.utils import timezone
+
+from .models import CountLine, CountSession, Supply
+from .stock import available_units
+from .versioning import update_supplies
+
+
+COUNT_BATCH_SIZE = 500
+# Reporting stops after this many bad rows; the upload is rejected either way
+MAX_PARSE_ERRORS = 20
+SUPPLY_ID_COLUMNS = ('supply_id', 'id')
+COUNTED_COLUMNS = ('counted', 'counted_units', 'count')
+
+
+class StaleCountError(Exception):
+	def __init__(self, supply_ids):
+		super().__init__(f'Stock of {len(supply_ids)} counted supplies changed since the variances were computed.')
+		self.supply_ids = supply_ids
+
+
+def _column(fieldnames, candidates):
+	lookup = {name.strip().casefold(): name for name in fieldnames or ()}
+	return next((lookup[name] for name in candidates if name in lookup), None)
+
+
+def parse_count_csv(text):
+	# Returns ({supply_id: counted_units}, errors). Rows with a blank count are
+	# skipped, so a partly filled count sheet can be uploaded as it is.
+	reader = csv.DictReader(io.StringIO(text.lstrip('﻿')))
+	id_column = _column(reader.fieldnames, SUPPLY_ID_COLUMNS)
+	counted_column = _column(reader.fieldnames, COUNTED_COLUMNS)
+	if not id_column or not counted_column:
+		return {}, ['The file needs a "supply_id" column and a "counted" column.']
+	counts = {}
+	errors = []
+	for line_number, row in enumerate(reader, start=2):
+		raw = (row.get(counted_column) or '').strip()
+		if not raw:
+			continue
+		try:
+			supply_id = int((row.get(id_column) or '').strip())
+			counted = int(raw)
+			if counted < 0:
+				raise ValueError
+		except ValueError:
+			errors.append(f'Line {line_number}: expected a supply id and a whole, non-negative count.')
+			if len(errors) >= MAX_PARSE_ERRORS:
+				break
+			continue
+		counts[supply_id] = counted
+	return counts, errors
+
+
+def _system_state(supply_ids):
+	# {supply_id: (available units, version)}, read in chunks to stay under SQLite's variable limit
+	state = {}
+	supply_ids = list(supply_ids)
+	for start in range(0, len(supply_ids), COUNT_BATCH_SIZE):
+		rows = (
+			Supply.objects.filter(pk__in=supply_ids[start:start + COUNT_BATCH_SIZE])
+			.annotate(units=available_units())
+			.values_list('pk', 'units', 'version')
+		)
+		state.update((pk, (units, version)) for pk, units, version in rows)
+	return state
+
+
+def _variances(counted, system):
+	# One vectorized pass over the whole count
+	return (np.asarray(counted, dtype=np.int64) - np.asarray(system, dtype=np.int64)).tolist()
+
+
+def record_counts(session, counts):
+	# Adds or replaces the session's lines for the given supplies; returns the ids that don't exist
+	state = _system_state(counts)
+	unknown = sorted(set(counts) - set(state))
+	ids = [pk for pk in counts if pk in state]
+	counted = [counts[pk] for pk in ids]
+	variances = _variances(counted, [state[pk][0] for pk in ids])
+	lines = [
+		CountLine(
+			session=session,
+			supply_id=pk,
+			counted_units=units,
+			system_units=state[pk][0],
+			variance=variance,
+			supply_version=state[pk][1],
+		)
+		for pk, units, variance in zip(ids, counted, variances)
+	]
+	with transaction.atomic():
+		CountLine.objects.bulk_create(
+			lines,
+			batch_size=COUNT_BATCH_SIZE,
+			update_conflicts=True,
+			unique_fields=['session', 'supply'],
+			update_fields=['counted_units', 'system_units', 'variance', 'supply_version'],
+		)
+	return unknown
+
+
+def refresh_variances(session):
+	# Re-reads system stock, e.g. after deliveries or approvals landed mid-count
+	lines = list(session.lines.only('pk', 'supply_id', 'counted_units'))
+	state = _system_state(line.supply_id for line in lines)
+	# Supplies retired mid-count can't be applied; their lines would keep the count stale forever
+	gone = [line.pk for line in lines if line.supply_id not in state]
+	lines = [line for line in lines if line.supply_id in state]
+	variances = _variances([line.counted_units for line in lines], [state[line.supply_id][0] for line in lines])
+	for line, variance in zip(lines, variances):
+		line.system_units, line.supply_version = state[line.supply_id]
+		line.variance = variance
+	with transaction.atomic():
+		CountLine.objects.filter(pk__in=gone).delete()
+		CountLine.objects.bulk_update(lines, ['system_units', 'variance', 'supply_version'], batch_size=COUNT_BATCH_SIZE)
+	return len(lines)
+
+
+def count_summary(session):
+	variances = np.fromiter(session.lines.values_list('variance', flat=True), dtype=np.int64)
+	return {
+		'lines': int(variances.size),
+		'matched': int((variances == 0).sum()),
+		'over': int((variances > 0).sum()),
+		'short': int((variances < 0).sum()),
+		'units_over': int(variances[variances > 0].sum()),
+		'units_short': int(-variances[variances < 0].sum()),
+	}
+
+
+def apply_count(session, user):
+	pending = session.lines.exclude(variance=0)
+	counted = Subquery(CountLine.objects.filter(session=session, supply=OuterRef('pk')).values('counted_units')[:1])
+	with transaction.atomic():
+		# Anything that moved since review would be silently overwritten by the count
+		stale = list(pending.exclude(supply_version=F('supply__version')).values_list('supply_id', flat=True))
+		if stale:
+			raise StaleCountError(stale)
+		expected = pending.count()
+		# One UPDATE for the whole count, still guarded by each line's version
+		adjusted = update_supplies(
+			Supply.objects.filter(
+				Q(count_lines__variance__lt=0) | Q(count_lines__variance__gt=0),
+				count_lines__session=session,
+				count_lines__supply_version=F('version'),
+			),
+			quantity=counted,
+			boxes_count=Case(
+				When(unit__in=('pack', 'ream'), then=counted),
+				When(items_per_box__gt=0, then=counted / F('items_per_box')),
+				default=F('boxes_count'),
+			),
+			version=F('version') + 1,
+		)
+		if adjusted != expected:
+			raise StaleCountError(list(pending.exclude(supply__version=F('supply_version') + 1).values_list('supply_id', flat=True)))
+		# Claim the session last: a concurrent apply of the same session rolls back here
+		applied = CountSession.objects.filter(pk=session.pk, status=CountSession.STATUS_DRAFT).update(
+			status=CountSession.STATUS_APPLIED, applied_by=user, applied_at=timezone.now()
+		)
+		if not applied:
+			raise StaleCountError([])
+	return adjusted
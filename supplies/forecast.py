@@ -0,0 +1,111 @@
+from datetime import timedelta
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Cast, Coalesce
+from django.utils import timezone
+
+from requisitions.models import SupplyRequest, SupplyRequestItem
+
+from .catalog import bump_catalog_version
+from .models import Supply, SupplyForecast
+from .stock import available_units
+
+
+FORECAST_WEEKS = 26
+# Smoothing factor: weight of the latest week; older weeks decay by (1 - alpha) each
+FORECAST_ALPHA = 0.3
+WEEK_SECONDS = 7 * 24 * 60 * 60
+
+RISK_CRITICAL = 'critical'
+RISK_HIGH = 'high'
+RISK_MEDIUM = 'medium'
+RISK_LOW = 'low'
+RISK_IDLE = 'idle'
+# Upper bound in days of stock left for each level
+RISK_THRESHOLDS = (
+	(RISK_CRITICAL, 7),
+	(RISK_HIGH, 14),
+	(RISK_MEDIUM, 30),
+)
+
+
+def compute_daily_rates(now=None, weeks=FORECAST_WEEKS, alpha=FORECAST_ALPHA):
+	now = now or timezone.now()
+	supplies = list(Supply.objects.order_by('pk').values_list('pk', 'created_at'))
+	if not supplies:
+		return {}
+	ids = np.array([pk for pk, created_at in supplies])
+	created = np.array([created_at.timestamp() for pk, created_at in supplies])
+
+	# Stock leaves at approval; legacy rows without a decision time use the request time
+	rows = list(
+		SupplyRequestItem.objects.filter(request__status=SupplyRequest.STATUS_APPROVED)
+		.annotate(issued_at=Coalesce('request__decision_at', 'request__requested_at'))
+		.filter(issued_at__gte=now - timedelta(weeks=weeks))
+		.values_list('supply_id', 'issued_at', 'quantity')
+	)
+	# usage[i, w]: quantity of supply i issued w weeks ago (0 = the last seven days)
+	usage = np.zeros((len(ids), weeks))
+	if rows:
+		supply_ids, stamps, quantities = zip(*rows)
+		supply_ids = np.array(supply_ids)
+		ages = (now.timestamp() - np.array([stamp.timestamp() for stamp in stamps])) // WEEK_SECONDS
+		# Demand for retired supplies stays in history but has no row here
+		positions = np.minimum(np.searchsorted(ids, supply_ids), len(ids) - 1)
+		known = ids[positions] == supply_ids
+		np.add.at(
+			usage,
+			(positions[known], np.clip(ages.astype(int), 0, weeks - 1)[known]),
+			np.array(quantities, dtype=float)[known],
+		)
+
+	# Exponentially weighted average over weeks, newest first, for all supplies at once.
+	# Weeks before a supply was added are left out rather than counted as zero demand.
+	weights = alpha * (1 - alpha) ** np.arange(weeks)
+	supply_weeks = np.maximum(np.ceil((now.timestamp() - created) / WEEK_SECONDS), 1)
+	weights = weights[np.newaxis, :] * (np.arange(weeks)[np.newaxis, :] < supply_weeks[:, np.newaxis])
+	weekly = (usage * weights).sum(axis=1) / weights.sum(axis=1)
+	return dict(zip(ids.tolist(), (weekly / 7).tolist()))
+
+
+def refresh_forecasts(now=None):
+	now = now or timezone.now()
+	rates = compute_daily_rates(now)
+	with transaction.atomic():
+		SupplyForecast.objects.bulk_create(
+			[SupplyForecast(supply_id=pk, daily_rate=rate, computed_at=now) for pk, rate in rates.items()],
+			update_conflicts=True,
+			unique_fields=['supply'],
+			update_fields=['daily_rate', 'computed_at'],
+		)
+		# Pages showing days left are cached per catalog version
+		bump_catalog_version()
+	return len(rates)
+
+
+def with_days_left(queryset):
+	# Days left uses current stock, so it stays accurate between forecast runs
+	queryset = queryset.annotate(
+		daily_rate=F('forecast__daily_rate'),
+		days_left=Case(
+			When(forecast__daily_rate__gt=0, then=Cast(available_units(), FloatField()) / F('forecast__daily_rate')),
+			default=None,
+			output_field=FloatField(),
+		),
+	)
+	return queryset.annotate(stock_risk=Case(
+		*[When(days_left__lte=limit, then=Value(level)) for level, limit in RISK_THRESHOLDS],
+		When(days_left__isnull=False, then=Value(RISK_LOW)),
+		default=Value(RISK_IDLE),
+	))
+
+
+def order_by_risk(queryset):
+	# Soonest to run out first; supplies with no recent demand last
+	return queryset.order_by(F('days_left').asc(nulls_last=True), 'name')
+
+
+def running_out_supplies(limit=8, days=RISK_THRESHOLDS[-1][1]):
+	return list(order_by_risk(with_days_left(Supply.objects.all()).filter(days_left__lte=days))[:limit])
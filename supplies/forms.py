@@ -1,23 +1,35 @@
 from django import forms
 
-from .models import IncomingSupply, Supply
+from .counts import parse_count_csv
+from .models import CountSession, IncomingSupply, Supply
 
 
 class SupplyForm(forms.ModelForm):
+    # Version of the row the form was rendered from, checked again on save
+    version = forms.IntegerField(required=False, min_value=1, widget=forms.HiddenInput)
+
     class Meta:
         model = Supply
-        fields = ['name', 'size_spec', 'description', 'category', 'boxes_count', 'items_per_box', 'quantity', 'unit']
+        fields = ['name', 'size_spec', 'sku', 'description', 'category', 'boxes_count', 'items_per_box', 'quantity', 'unit', 'lead_time_days', 'safety_stock']
         widgets = {
             'name': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'e.g., Bond paper A4'}),
             'size_spec': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Size / Specification'}),
+            'sku': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Scan or type the barcode', 'autocomplete': 'off'}),
             'description': forms.Textarea(attrs={'class': 'form-control', 'rows': 3, 'placeholder': 'Short description or notes'}),
             'category': forms.Select(attrs={'class': 'form-select'}),
             'boxes_count': forms.NumberInput(attrs={'class': 'form-control', 'min': 0, 'placeholder': 'No. of boxes'}),
             'items_per_box': forms.NumberInput(attrs={'class': 'form-control', 'min': 0, 'placeholder': 'Items per box'}),
             'quantity': forms.NumberInput(attrs={'class': 'form-control', 'min': 0, 'placeholder': '0'}),
             'unit': forms.Select(attrs={'class': 'form-select'}),
+            'lead_time_days': forms.NumberInput(attrs={'class': 'form-control', 'min': 0, 'placeholder': 'Days from order to delivery'}),
+            'safety_stock': forms.NumberInput(attrs={'class': 'form-control', 'min': 0, 'placeholder': 'Units to keep in reserve'}),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk and 'version' not in self.initial:
+            self.initial['version'] = self.instance.version
+
 
 class IncomingSupplyForm(forms.ModelForm):
     boxes_count = forms.IntegerField(
@@ -70,3 +82,47 @@ class IncomingSupplyForm(forms.ModelForm):
         if commit:
             obj.save()
         return obj
+
+
+class CountSessionForm(forms.ModelForm):
+    class Meta:
+        model = CountSession
+        fields = ['notes']
+        widgets = {
+            'notes': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'e.g., Year-end stock-take, supply room A'}),
+        }
+
+
+class CountUploadForm(forms.Form):
+    file = forms.FileField(
+        required=False,
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,text/csv'}),
+        label='Count Sheet (CSV)'
+    )
+    entries = forms.CharField(
+        required=False,
+        widget=forms.Textarea(attrs={'class': 'form-control font-monospace', 'rows': 5, 'placeholder': 'supply_id,counted\n12,40\n15,0'}),
+        label='Or Type Counts'
+    )
+
+    def clean(self):
+        data = super().clean()
+        upload = data.get('file')
+        entries = (data.get('entries') or '').strip()
+        if not upload and not entries:
+            raise forms.ValidationError('Upload a count sheet or type at least one count.')
+        if upload:
+            try:
+                text = upload.read().decode('utf-8-sig')
+            except UnicodeDecodeError:
+                raise forms.ValidationError('The count sheet must be a UTF-8 CSV file.')
+        else:
+            # Typed counts may leave out the header row
+            text = entries if entries[:1].isalpha() else 'supply_id,counted\n' + entries
+        counts, errors = parse_count_csv(text)
+        if errors:
+            raise forms.ValidationError(errors)
+        if not counts:
+            raise forms.ValidationError('No counts found; fill in the "counted" column for the supplies you counted.')
+        data['counts'] = counts
+        return data
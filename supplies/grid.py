@@ -0,0 +1,107 @@
+import copy
+
+from django.db import IntegrityError, transaction
+from django.forms.models import model_to_dict
+
+from .forms import SupplyForm
+from .models import Supply
+from .versioning import bulk_update_supplies, changed_fields
+
+
+# Columns the grid edits in place; quantity follows from them like on the form
+GRID_FIELDS = ('name', 'size_spec', 'sku', 'category', 'unit', 'boxes_count', 'items_per_box', 'lead_time_days', 'safety_stock')
+GRID_PATCH_MAX_ROWS = 500
+GRID_BATCH_SIZE = 100
+
+
+class GridPatchError(Exception):
+	pass
+
+
+def parse_patch(payload):
+	# {"rows": [{"id": 12, "version": 3, "changes": {"category": "Paper Supplies"}}, ...]}
+	rows = payload.get('rows') if isinstance(payload, dict) else None
+	if not isinstance(rows, list) or not rows:
+		raise GridPatchError('Send {"rows": [{"id", "version", "changes"}, ...]}.')
+	if len(rows) > GRID_PATCH_MAX_ROWS:
+		raise GridPatchError(f'Send at most {GRID_PATCH_MAX_ROWS} rows per patch.')
+	patch = {}
+	for row in rows:
+		try:
+			supply_id, version, changes = int(row['id']), int(row['version']), row['changes']
+		except (KeyError, TypeError, ValueError):
+			raise GridPatchError('Every row needs a numeric "id" and "version" and a "changes" object.') from None
+		if not isinstance(changes, dict):
+			raise GridPatchError(f'Row {supply_id}: "changes" must be an object.')
+		unknown = set(changes) - set(GRID_FIELDS)
+		if unknown:
+			raise GridPatchError(f"Row {supply_id}: {', '.join(sorted(unknown))} can't be edited in the grid.")
+		patch[supply_id] = (version, changes)
+	return patch
+
+
+def _derive_quantity(supply):
+	# Same rule as the supply form
+	if supply.unit in ('pack', 'ream'):
+		supply.quantity = supply.boxes_count or 0
+	else:
+		supply.quantity = (supply.boxes_count or 0) * (supply.items_per_box or 0)
+
+
+def apply_patch(patch):
+	# Validates every row with SupplyForm, then writes the valid, current ones with a
+	# single bulk_update(). Returns {supply_id: result} in the order of the patch.
+	results = {}
+	updated = []
+	fields = set()
+	with transaction.atomic():
+		supplies = {}
+		ids = list(patch)
+		for start in range(0, len(ids), GRID_BATCH_SIZE):
+			supplies.update(Supply.objects.select_for_update().in_bulk(ids[start:start + GRID_BATCH_SIZE]))
+		names = {}
+		skus = {}
+		for supply_id, (version, changes) in patch.items():
+			supply = supplies.get(supply_id)
+			if supply is None:
+				results[supply_id] = {'status': 'missing'}
+				continue
+			if supply.version != version:
+				results[supply_id] = {'status': 'conflict', 'version': supply.version, 'values': model_to_dict(supply, fields=GRID_FIELDS)}
+				continue
+			data = {**model_to_dict(supply, fields=SupplyForm._meta.fields), **changes}
+			# is_valid() copies the posted values onto the instance
+			original = copy.copy(supply)
+			form = SupplyForm(data, instance=supply)
+			if not form.is_valid():
+				results[supply_id] = {'status': 'invalid', 'errors': {name: list(errors) for name, errors in form.errors.items()}}
+				continue
+			key = (supply.name, supply.size_spec)
+			if key in names:
+				# validate_unique() only sees saved rows, not the rest of this patch
+				results[supply_id] = {'status': 'invalid', 'errors': {'size_spec': [f'Row {names[key]} in this patch already uses this name and size.']}}
+				continue
+			if supply.sku and supply.sku in skus:
+				results[supply_id] = {'status': 'invalid', 'errors': {'sku': [f'Row {skus[supply.sku]} in this patch already uses this SKU.']}}
+				continue
+			names[key] = supply_id
+			if supply.sku:
+				skus[supply.sku] = supply_id
+			_derive_quantity(supply)
+			row_fields = changed_fields(original, supply, SupplyForm._meta.fields)
+			if 'name' in row_fields and supply.assign_family():
+				row_fields.append('family')
+			if not row_fields:
+				results[supply_id] = {'status': 'unchanged', 'version': supply.version}
+				continue
+			supply.version += 1
+			fields.update(row_fields)
+			updated.append(supply)
+			results[supply_id] = {'status': 'ok', 'version': supply.version, 'quantity': supply.quantity, 'boxes_count': supply.boxes_count}
+		if updated:
+			try:
+				bulk_update_supplies(updated, [*sorted(fields), 'version'], batch_size=GRID_BATCH_SIZE)
+			except IntegrityError:
+				# A clash with a row changed in this same patch, e.g. two SKUs swapped
+				raise GridPatchError('Two supplies would end up with the same name and size/specification, or the same SKU.') from None
+	return results
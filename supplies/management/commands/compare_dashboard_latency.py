@@ -0,0 +1,120 @@
+import asyncio
+import statistics
+import time
+from http.cookies import SimpleCookie
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+
+
+PATHS = (
+	('dashboard', 'dashboard', 'dashboard_async'),
+	('analytics', 'analytics_outgoing', 'analytics_outgoing_async'),
+)
+
+
+def _summarise(samples):
+	samples = sorted(samples)
+	p95 = samples[min(len(samples) - 1, int(round(len(samples) * 0.95)) - 1)]
+	return f'mean {statistics.fmean(samples):7.1f} ms | p50 {statistics.median(samples):7.1f} ms | p95 {p95:7.1f} ms'
+
+
+class Command(BaseCommand):
+	help = (
+		'Compare latency of the sync (WSGI) and async (ASGI) dashboard and analytics views. '
+		'Runs both handlers in-process by default; pass --wsgi-url/--asgi-url to measure '
+		'running servers, e.g. "manage.py runserver 8000" and "uvicorn config.asgi:application --port 8001".'
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('--requests', type=int, default=20, help='Timed requests per view.')
+		parser.add_argument('--username', help='Staff user to authenticate as (defaults to the first staff user).')
+		parser.add_argument('--wsgi-url', help='Base URL of a running WSGI server.')
+		parser.add_argument('--asgi-url', help='Base URL of a running ASGI server.')
+
+	def handle(self, *args, **options):
+		User = get_user_model()
+		users = User.objects.filter(is_staff=True, is_active=True)
+		if options['username']:
+			users = users.filter(username=options['username'])
+		user = users.order_by('pk').first()
+		if user is None:
+			raise CommandError('No active staff user found to authenticate as.')
+		count = options['requests']
+		if bool(options['wsgi_url']) != bool(options['asgi_url']):
+			raise CommandError('Pass both --wsgi-url and --asgi-url, or neither.')
+
+		if options['wsgi_url']:
+			results = self._measure_servers(user, options['wsgi_url'], options['asgi_url'], count)
+		else:
+			# The in-process test clients always send Host: testserver
+			with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+				results = self._measure_in_process(user, count)
+
+		for label, sync_samples, async_samples in results:
+			self.stdout.write(f'{label}')
+			self.stdout.write(f'  sync  (WSGI): {_summarise(sync_samples)}')
+			self.stdout.write(f'  async (ASGI): {_summarise(async_samples)}')
+
+	def _measure_in_process(self, user, count):
+		client = Client()
+		client.force_login(user)
+
+		def time_sync(path):
+			client.get(path)  # warm-up
+			samples = []
+			for _ in range(count):
+				started = time.perf_counter()
+				response = client.get(path)
+				samples.append((time.perf_counter() - started) * 1000)
+				if response.status_code != 200:
+					raise CommandError(f'{path} returned {response.status_code}.')
+			return samples
+
+		async def time_async(path):
+			async_client = AsyncClient()
+			await async_client.aforce_login(user)
+			await async_client.get(path)  # warm-up
+			samples = []
+			for _ in range(count):
+				started = time.perf_counter()
+				response = await async_client.get(path)
+				samples.append((time.perf_counter() - started) * 1000)
+				if response.status_code != 200:
+					raise CommandError(f'{path} returned {response.status_code}.')
+			return samples
+
+		results = []
+		for label, sync_name, async_name in PATHS:
+			sync_samples = time_sync(reverse(sync_name))
+			async_samples = asyncio.run(time_async(reverse(async_name)))
+			results.append((label, sync_samples, async_samples))
+		return results
+
+	def _measure_servers(self, user, wsgi_url, asgi_url, count):
+		client = Client()
+		client.force_login(user)
+		cookie = SimpleCookie()
+		cookie[settings.SESSION_COOKIE_NAME] = client.cookies[settings.SESSION_COOKIE_NAME].value
+
+		def time_url(url):
+			samples = []
+			for attempt in range(count + 1):
+				request = Request(url, headers={'Cookie': cookie.output(header='', sep=';').strip()})
+				started = time.perf_counter()
+				with urlopen(request) as response:
+					response.read()
+				if attempt:  # the first request only warms up the server
+					samples.append((time.perf_counter() - started) * 1000)
+			return samples
+
+		results = []
+		for label, sync_name, async_name in PATHS:
+			sync_samples = time_url(wsgi_url.rstrip('/') + reverse(sync_name))
+			async_samples = time_url(asgi_url.rstrip('/') + reverse(async_name))
+			results.append((label, sync_samples, async_samples))
+		return results
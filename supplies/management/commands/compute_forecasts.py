@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from supplies.forecast import refresh_forecasts
+from supplies.tasks import refresh_supply_forecasts
+
+
+class Command(BaseCommand):
+	help = 'Recompute per-supply consumption rates used for days-of-stock-left. Schedule it daily.'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--enqueue', action='store_true', help='Queue the work for run_worker instead of running it now.')
+
+	def handle(self, *args, **options):
+		if options['enqueue']:
+			result = refresh_supply_forecasts.enqueue()
+			self.stdout.write(self.style.SUCCESS(f'Queued job {result.id}.'))
+			return
+		updated = refresh_forecasts()
+		self.stdout.write(self.style.SUCCESS(f'Updated forecasts for {updated} supplies.'))
@@ -0,0 +1,31 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from supplies.checkpoints import create_checkpoint, day_end, last_month_end
+from supplies.tasks import create_stock_checkpoint
+
+
+class Command(BaseCommand):
+	help = 'Store every supply\'s stock as of the end of a day (default: the last day of last month). Schedule it monthly.'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--date', help='Day to checkpoint, YYYY-MM-DD (stock after all of that day\'s movements).')
+		parser.add_argument('--enqueue', action='store_true', help='Queue last month-end\'s checkpoint for run_worker instead of running it now.')
+
+	def handle(self, *args, **options):
+		if options['enqueue']:
+			if options['date']:
+				raise CommandError('--enqueue always checkpoints last month-end; drop --date.')
+			result = create_stock_checkpoint.enqueue()
+			self.stdout.write(self.style.SUCCESS(f'Queued job {result.id}.'))
+			return
+		try:
+			day = date.fromisoformat(options['date']) if options['date'] else last_month_end()
+		except ValueError:
+			raise CommandError('Use YYYY-MM-DD for --date.')
+		if day >= timezone.localdate():
+			raise CommandError('Only days that have ended can be checkpointed.')
+		checkpoint, count = create_checkpoint(day_end(day))
+		self.stdout.write(self.style.SUCCESS(f'Stored stock of {count} supplies as of {day:%Y-%m-%d}.'))
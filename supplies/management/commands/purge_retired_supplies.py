@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from supplies.retirement import purge_orphaned_supplies
+
+
+class Command(BaseCommand):
+	help = 'Delete retired supplies that have no deliveries, requests or counts, after SUPPLY_PURGE_AFTER_DAYS.'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--days', type=int, help='Only supplies retired at least this many days ago.')
+		parser.add_argument('--batch-size', type=int, default=100, help='Supplies deleted per transaction.')
+
+	def handle(self, *args, **options):
+		if options['batch_size'] < 1:
+			raise CommandError('--batch-size must be at least 1.')
+		if options['days'] is not None and options['days'] < 0:
+			raise CommandError('--days must not be negative.')
+		purged = purge_orphaned_supplies(days=options['days'], batch_size=options['batch_size'])
+		self.stdout.write(self.style.SUCCESS(f'Purged {purged} retired supply(ies).'))
@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-19 01:03
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('supplies', '0006_alter_incomingsupply_id_alter_supply_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SupplyForecast',
+            fields=[
+                ('supply', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='forecast', serialize=False, to='supplies.supply')),
+                ('daily_rate', models.FloatField(default=0)),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
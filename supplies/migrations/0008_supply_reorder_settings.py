@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-19 01:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('supplies', '0007_supplyforecast'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='supply',
+            name='lead_time_days',
+            field=models.PositiveSmallIntegerField(default=7),
+        ),
+        migrations.AddField(
+            model_name='supply',
+            name='safety_stock',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
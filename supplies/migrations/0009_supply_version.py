@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-19 01:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('supplies', '0008_supply_reorder_settings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='supply',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 6.0 on 2026-10-19 01:26
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('supplies', '0009_supply_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('as_of', models.DateTimeField(unique=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['-as_of'],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockCheckpointBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('units', models.IntegerField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='incomingsupply',
+            index=models.Index(fields=['status', 'received_at'], name='incoming_status_received_idx'),
+        ),
+        migrations.AddField(
+            model_name='stockcheckpointbalance',
+            name='checkpoint',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balances', to='supplies.stockcheckpoint'),
+        ),
+        migrations.AddField(
+            model_name='stockcheckpointbalance',
+            name='supply',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='supplies.supply'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='stockcheckpointbalance',
+            unique_together={('checkpoint', 'supply')},
+        ),
+    ]
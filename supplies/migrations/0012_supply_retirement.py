@@ -0,0 +1,42 @@
+# Generated by Django 6.0 on 2026-10-19 01:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('supplies', '0011_count_sessions'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='supply',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='supply',
+            name='is_active',
+            field=models.BooleanField(db_index=True, default=True),
+        ),
+        migrations.AddField(
+            model_name='supply',
+            name='retired_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='countline',
+            name='supply',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='count_lines', to='supplies.supply'),
+        ),
+        migrations.AlterField(
+            model_name='incomingsupply',
+            name='supply',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='incoming', to='supplies.supply'),
+        ),
+        migrations.AddConstraint(
+            model_name='supply',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_active', True)), fields=('name', 'size_spec'), name='supply_active_name_size_uniq'),
+        ),
+    ]
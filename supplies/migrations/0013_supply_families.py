@@ -0,0 +1,95 @@
+# Generated by Django 6.0 on 2026-10-19 01:40
+
+import difflib
+import re
+from collections import Counter
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Frozen copy of supplies.models.normalize_family_key
+def _family_key(name):
+    words = re.sub(r'[^0-9a-z]+', ' ', (name or '').casefold()).split()
+    return ''.join(word[:-1] if len(word) > 3 and word.endswith('s') and not word.endswith('ss') else word for word in words)
+
+
+def _closest(key, candidates):
+    # One-off typo clean-up: a long key within a letter or two of a more common one joins it
+    if len(key) < 8:
+        return None
+    matches = difflib.get_close_matches(key, candidates, n=1, cutoff=0.92)
+    return matches[0] if matches else None
+
+
+def cluster_families(apps, schema_editor):
+    Supply = apps.get_model('supplies', 'Supply')
+    SupplyFamily = apps.get_model('supplies', 'SupplyFamily')
+    rows = list(Supply.objects.values_list('pk', 'name', 'category'))
+    names = Counter(name.strip() for pk, name, category in rows)
+    # Most used spellings first, so a typo joins the common spelling and not the other way round
+    by_key = {}
+    for name, count in names.most_common():
+        by_key.setdefault(_family_key(name), []).append(name)
+    canonical = {}
+    roots = {}
+    for key in sorted(by_key, key=lambda key: -sum(names[name] for name in by_key[key])):
+        # Only compare keys with the same start and the same digits: "A4" and "A5" are different products
+        bucket = roots.setdefault((key[:2], re.sub(r'[^0-9]', '', key)), [])
+        canonical[key] = _closest(key, bucket) or key
+        if canonical[key] == key:
+            bucket.append(key)
+    display = {}
+    categories = {}
+    for pk, name, category in rows:
+        key = canonical[_family_key(name)]
+        display.setdefault(key, by_key[key][0])
+        if category:
+            categories.setdefault(key, category)
+    SupplyFamily.objects.bulk_create(
+        [SupplyFamily(key=key, name=name, category=categories.get(key, '')) for key, name in display.items()],
+        batch_size=1000,
+    )
+    family_ids = dict(SupplyFamily.objects.values_list('key', 'pk'))
+    batch = []
+    for pk, name, category in rows:
+        batch.append(Supply(pk=pk, family_id=family_ids[canonical[_family_key(name)]]))
+        if len(batch) >= 2000:
+            Supply.objects.bulk_update(batch, ['family'])
+            batch = []
+    if batch:
+        Supply.objects.bulk_update(batch, ['family'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('supplies', '0012_supply_retirement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SupplyFamily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('category', models.CharField(blank=True, max_length=100)),
+                ('key', models.CharField(max_length=255, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name_plural': 'supply families',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='supply',
+            name='family',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='variants', to='supplies.supplyfamily'),
+        ),
+        migrations.RunPython(cluster_families, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='supply',
+            index=models.Index(fields=['family', 'size_spec'], name='supply_family_variant_idx'),
+        ),
+    ]
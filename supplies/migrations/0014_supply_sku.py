@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-19 01:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('supplies', '0013_supply_families'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='supply',
+            name='sku',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True, verbose_name='SKU / barcode'),
+        ),
+    ]
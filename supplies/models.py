@@ -1,7 +1,41 @@
+import re
+
+from django.conf import settings
 from django.db import models
 from django.utils import timezone
 
 
+def normalize_family_key(name):
+	# Case, spacing, punctuation and a plural "s" don't make a different product
+	words = re.sub(r'[^0-9a-z]+', ' ', (name or '').casefold()).split()
+	return ''.join(word[:-1] if len(word) > 3 and word.endswith('s') and not word.endswith('ss') else word for word in words)
+
+
+class SupplyFamily(models.Model):
+	# One product ("Ballpen"); its supplies are the size/spec variants
+	name = models.CharField(max_length=255)
+	category = models.CharField(max_length=100, blank=True)
+	key = models.CharField(max_length=255, unique=True)
+	created_at = models.DateTimeField(auto_now_add=True)
+
+	class Meta:
+		ordering = ['name']
+		verbose_name_plural = 'supply families'
+
+	def __str__(self):
+		return self.name
+
+	@classmethod
+	def for_name(cls, name, category=''):
+		family, _ = cls.objects.get_or_create(key=normalize_family_key(name), defaults={'name': name.strip(), 'category': category or ''})
+		return family
+
+
+class ActiveSupplyManager(models.Manager):
+	def get_queryset(self):
+		return super().get_queryset().filter(is_active=True)
+
+
 class Supply(models.Model):
 	CATEGORY_CHOICES = (
 		('Writing Supplies', 'Writing Supplies'),
@@ -34,14 +68,56 @@ class Supply(models.Model):
 	items_per_box = models.PositiveIntegerField(default=0)
 	quantity = models.PositiveIntegerField(default=0)
 	unit = models.CharField(max_length=50, choices=UNIT_CHOICES)
+	# Reorder planning: days from ordering to delivery, and units to keep in reserve
+	lead_time_days = models.PositiveSmallIntegerField(default=7)
+	safety_stock = models.PositiveIntegerField(default=0)
+	# Bumped on every write; edits check it so a stale form can't undo a concurrent change
+	version = models.PositiveIntegerField(default=1)
 	created_at = models.DateTimeField(auto_now_add=True)
+	# Retired supplies leave the catalog but keep their deliveries, requests and counts
+	is_active = models.BooleanField(default=True, db_index=True)
+	retired_at = models.DateTimeField(null=True, blank=True)
+	family = models.ForeignKey(SupplyFamily, on_delete=models.PROTECT, null=True, blank=True, related_name='variants')
+	# Barcode or stock-keeping code printed on the item; scans resolve through its unique index
+	sku = models.CharField('SKU / barcode', max_length=64, unique=True, null=True, blank=True)
+
+	# The catalog only shows active supplies; history and stock arithmetic use all_objects
+	objects = ActiveSupplyManager()
+	all_objects = models.Manager()
 
 	class Meta:
-		unique_together = ('name', 'size_spec')
+		constraints = [
+			# A retired supply's name can be reused by a new one
+			models.UniqueConstraint(fields=['name', 'size_spec'], condition=models.Q(is_active=True), name='supply_active_name_size_uniq'),
+		]
+		indexes = [
+			models.Index(fields=['family', 'size_spec'], name='supply_family_variant_idx'),
+		]
 
 	def __str__(self):
 		return f"{self.name} ({self.quantity} {self.unit})"
 
+	def assign_family(self):
+		# Returns True when the (re)named supply moved to another family
+		family = SupplyFamily.for_name(self.name, self.category)
+		changed = family.pk != self.family_id
+		self.family = family
+		return changed
+
+	def save(self, *args, **kwargs):
+		# NULL, not '', for "no code": many supplies have none and the column is unique
+		self.sku = (self.sku or '').strip() or None
+		if self.family_id is None:
+			self.assign_family()
+			if kwargs.get('update_fields') is not None:
+				kwargs['update_fields'] = {*kwargs['update_fields'], 'family'}
+		# Plain saves (admin, scripts) move the version too, so open edit forms notice them
+		if not self._state.adding:
+			self.version += 1
+			if kwargs.get('update_fields') is not None:
+				kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+		super().save(*args, **kwargs)
+
 
 class IncomingSupply(models.Model):
 	STATUS_PENDING = 'pending'
@@ -51,7 +127,7 @@ class IncomingSupply(models.Model):
 		(STATUS_RECEIVED, 'Received'),
 	]
 
-	supply = models.ForeignKey(Supply, on_delete=models.CASCADE, related_name='incoming')
+	supply = models.ForeignKey(Supply, on_delete=models.PROTECT, related_name='incoming')
 	quantity = models.PositiveIntegerField()
 	expected_date = models.DateField(null=True, blank=True)
 	notes = models.TextField(blank=True)
@@ -59,5 +135,85 @@ class IncomingSupply(models.Model):
 	date_added = models.DateTimeField(default=timezone.now)
 	received_at = models.DateTimeField(null=True, blank=True)
 
+	class Meta:
+		indexes = [
+			models.Index(fields=['status', 'received_at'], name='incoming_status_received_idx'),
+		]
+
 	def __str__(self):
 		return f"Incoming {self.quantity} {self.supply.unit} {self.supply.name}"
+
+
+class SupplyForecast(models.Model):
+	supply = models.OneToOneField(Supply, on_delete=models.CASCADE, primary_key=True, related_name='forecast')
+	# Smoothed consumption in stock units per day; 0 when nothing was issued in the window
+	daily_rate = models.FloatField(default=0)
+	computed_at = models.DateTimeField(default=timezone.now)
+
+	def __str__(self):
+		return f"{self.supply.name}: {self.daily_rate:.2f}/day"
+
+
+class StockCheckpoint(models.Model):
+	# Stock of every supply at one instant: all movements before as_of are included
+	as_of = models.DateTimeField(unique=True)
+	created_at = models.DateTimeField(default=timezone.now)
+
+	class Meta:
+		ordering = ['-as_of']
+
+	def __str__(self):
+		return f"Stock as of {self.as_of:%Y-%m-%d %H:%M}"
+
+
+class StockCheckpointBalance(models.Model):
+	checkpoint = models.ForeignKey(StockCheckpoint, on_delete=models.CASCADE, related_name='balances')
+	supply = models.ForeignKey(Supply, on_delete=models.CASCADE, related_name='+')
+	# Available units: boxes for pack/ream supplies, pieces otherwise
+	units = models.IntegerField()
+
+	class Meta:
+		unique_together = ('checkpoint', 'supply')
+
+	def __str__(self):
+		return f"{self.supply_id}: {self.units}"
+
+
+class CountSession(models.Model):
+	# A physical stock-take: counted units per supply, reviewed, then applied at once
+	STATUS_DRAFT = 'draft'
+	STATUS_APPLIED = 'applied'
+	STATUS_CHOICES = [
+		(STATUS_DRAFT, 'Draft'),
+		(STATUS_APPLIED, 'Applied'),
+	]
+
+	notes = models.CharField(max_length=255, blank=True)
+	status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_DRAFT)
+	created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name='+')
+	created_at = models.DateTimeField(default=timezone.now)
+	applied_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT, null=True, blank=True, related_name='+')
+	applied_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+	class Meta:
+		ordering = ['-created_at']
+
+	def __str__(self):
+		return f"Count #{self.pk} ({self.status})"
+
+
+class CountLine(models.Model):
+	session = models.ForeignKey(CountSession, on_delete=models.CASCADE, related_name='lines')
+	supply = models.ForeignKey(Supply, on_delete=models.PROTECT, related_name='count_lines')
+	# Available units, like the rest of the stock arithmetic; system_units and
+	# supply_version are the supply's state when the variance was computed
+	counted_units = models.PositiveIntegerField()
+	system_units = models.IntegerField()
+	variance = models.IntegerField()
+	supply_version = models.PositiveIntegerField()
+
+	class Meta:
+		unique_together = ('session', 'supply')
+
+	def __str__(self):
+		return f"{self.supply_id}: counted {self.counted_units} ({self.variance:+d})"
@@ -0,0 +1,55 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Supply
+
+
+class RestoreConflictError(Exception):
+	pass
+
+
+def retire_supply(supply):
+	supply.is_active = False
+	supply.retired_at = timezone.now()
+	# save() bumps the version and, through post_save, the catalog
+	supply.save(update_fields=['is_active', 'retired_at'])
+	return supply
+
+
+def restore_supply(supply):
+	# Another active supply may have taken the name since
+	if Supply.objects.filter(name=supply.name, size_spec=supply.size_spec).exists():
+		raise RestoreConflictError(f'An active supply named {supply.name} ({supply.size_spec or "no size/spec"}) already exists.')
+	supply.is_active = True
+	supply.retired_at = None
+	supply.save(update_fields=['is_active', 'retired_at'])
+	return supply
+
+
+def orphaned_supplies(days=None, now=None):
+	# Retired long enough ago and never delivered, requested or counted
+	days = settings.SUPPLY_PURGE_AFTER_DAYS if days is None else days
+	cutoff = (now or timezone.now()) - timedelta(days=days)
+	return Supply.all_objects.filter(
+		is_active=False,
+		retired_at__lte=cutoff,
+		incoming__isnull=True,
+		request_items__isnull=True,
+		count_lines__isnull=True,
+	)
+
+
+def purge_orphaned_supplies(days=None, batch_size=100, now=None):
+	purged = 0
+	while True:
+		pks = list(orphaned_supplies(days, now).values_list('pk', flat=True).distinct()[:batch_size])
+		if not pks:
+			return purged
+		# Short transactions; the re-check inside skips supplies that gained history meanwhile
+		with transaction.atomic():
+			batch = list(orphaned_supplies(days, now).filter(pk__in=pks).values_list('pk', flat=True).distinct())
+			Supply.all_objects.filter(pk__in=batch).delete()
+		purged += len(batch)
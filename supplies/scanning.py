@@ -0,0 +1,131 @@
+import json
+
+from django.db import transaction
+from django.utils import timezone
+
+from requisitions.models import SupplyRequest, SupplyRequestItem
+from requisitions.tasks import prerender_request_receipts
+
+from .models import IncomingSupply, Supply
+from .versioning import STOCK_FIELDS, save_supply_fields
+
+
+SCAN_BATCH_MAX_LINES = 200
+SCAN_MODE_RECEIVE = 'receive'
+SCAN_MODE_ISSUE = 'issue'
+
+
+class ScanBatchError(Exception):
+	pass
+
+
+def lookup_sku(code):
+	# Single-row fetch through the unique sku index
+	code = (code or '').strip()
+	if not code:
+		return None
+	return Supply.objects.filter(sku=code).first()
+
+
+def scan_payload(supply):
+	available = supply.boxes_count if supply.unit in ('pack', 'ream') else supply.quantity
+	return {
+		'id': supply.pk,
+		'sku': supply.sku,
+		'name': supply.name,
+		'size_spec': supply.size_spec,
+		'unit': supply.unit,
+		'available': available,
+	}
+
+
+def parse_batch(raw):
+	# [{"supply_id": 12, "quantity": 3}, ...] as posted by the scan screen; repeats are added up
+	try:
+		lines = json.loads(raw or '[]')
+	except ValueError:
+		raise ScanBatchError('The scanned batch could not be read. Reload the page and scan again.') from None
+	if not isinstance(lines, list) or not lines:
+		raise ScanBatchError('Scan at least one item.')
+	batch = {}
+	for line in lines:
+		try:
+			supply_id, quantity = int(line['supply_id']), int(line['quantity'])
+		except (KeyError, TypeError, ValueError):
+			raise ScanBatchError('Every scanned line needs a supply and a whole quantity.') from None
+		if quantity <= 0:
+			raise ScanBatchError('Quantities must be greater than zero.')
+		batch[supply_id] = batch.get(supply_id, 0) + quantity
+	if len(batch) > SCAN_BATCH_MAX_LINES:
+		raise ScanBatchError(f'Commit at most {SCAN_BATCH_MAX_LINES} different items at a time.')
+	return batch
+
+
+def _batch_supplies(batch):
+	supplies = Supply.objects.in_bulk(list(batch))
+	missing = set(batch) - set(supplies)
+	if missing:
+		raise ScanBatchError(f'{len(missing)} scanned item(s) are no longer in the catalog.')
+	return supplies
+
+
+def receive_batch(batch, notes=''):
+	# Each line becomes a received delivery, so it shows in history and as-of stock
+	now = timezone.now()
+	with transaction.atomic():
+		supplies = _batch_supplies(batch)
+		deliveries = []
+		for supply_id, quantity in batch.items():
+			supply = supplies[supply_id]
+			if supply.unit in ('pack', 'ream'):
+				supply.boxes_count = supply.boxes_count + quantity
+				supply.quantity = supply.boxes_count
+			else:
+				if supply.items_per_box:
+					supply.boxes_count = supply.boxes_count + quantity // supply.items_per_box
+				supply.quantity = supply.quantity + quantity
+			save_supply_fields(supply, STOCK_FIELDS)
+			deliveries.append(IncomingSupply(
+				supply=supply, quantity=quantity, notes=notes, status=IncomingSupply.STATUS_RECEIVED, date_added=now, received_at=now,
+			))
+		IncomingSupply.objects.bulk_create(deliveries)
+	return len(deliveries)
+
+
+def issue_batch(batch, user, department, requester_name='', notes=''):
+	# Issuing at the desk is an already-approved request, so it counts everywhere approvals do
+	now = timezone.now()
+	with transaction.atomic():
+		supplies = _batch_supplies(batch)
+		for supply_id, quantity in batch.items():
+			supply = supplies[supply_id]
+			available = supply.boxes_count if supply.unit in ('pack', 'ream') else supply.quantity
+			if quantity > available:
+				raise ScanBatchError(f'Not enough stock for {supply.name} ({supply.size_spec or "Standard"}): {available} {supply.unit} available.')
+		supply_request = SupplyRequest.objects.create(
+			user=user,
+			requester_name=requester_name,
+			department=department,
+			notes=notes,
+			status=SupplyRequest.STATUS_APPROVED,
+			decided_by=user,
+			decision_at=now,
+		)
+		SupplyRequestItem.objects.bulk_create([
+			SupplyRequestItem(request=supply_request, supply=supplies[supply_id], quantity=quantity)
+			for supply_id, quantity in batch.items()
+		])
+		for supply_id, quantity in batch.items():
+			supply = supplies[supply_id]
+			if supply.unit in ('pack', 'ream'):
+				supply.boxes_count = supply.boxes_count - quantity
+				supply.quantity = supply.boxes_count
+				fields = STOCK_FIELDS
+			else:
+				supply.quantity = supply.quantity - quantity
+				fields = ['quantity']
+			# Fails, and rolls back the whole batch, if the stock moved since it was read
+			save_supply_fields(supply, fields)
+		prerender_request_receipts.enqueue([supply_request.pk])
+	return supply_request
+
@@ -0,0 +1,10 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .catalog import bump_catalog_version
+from .models import Supply
+
+
+@receiver([post_save, post_delete], sender=Supply, dispatch_uid='supplies_catalog_changed')
+def supply_changed(sender, **kwargs):
+	bump_catalog_version()
@@ -0,0 +1,133 @@
+import hashlib
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Case, F, FloatField, IntegerField, Max, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Ceil, Coalesce, Greatest
+from django.utils import timezone
+
+from requisitions.events import latest_event_id
+from requisitions.models import SupplyRequest, SupplyRequestItem
+
+from .catalog import get_catalog_version
+from .models import IncomingSupply, Supply
+
+
+# Set-based stock arithmetic for Supply querysets. Everything is expressed in
+# "available units": boxes for pack/ream supplies, pieces for everything else,
+# which is also how request items and incoming deliveries are counted.
+
+# Supplies at or below this many available units get the "Low on stock" badge
+LOW_STOCK_THRESHOLD = 2
+PROJECTION_DAYS = 14
+# Cached projections are keyed by projection_stamp(), so this only bounds how
+# long an edit made outside the app (e.g. in the admin) can go unnoticed
+PROJECTION_CACHE_TIMEOUT = 10 * 60
+
+
+def default_horizon():
+	return timezone.localdate() + timedelta(days=PROJECTION_DAYS)
+
+
+def available_units():
+	return Case(
+		When(unit__in=('pack', 'ream'), then=F('boxes_count')),
+		default=F('quantity'),
+		output_field=IntegerField(),
+	)
+
+
+def _subquery_sum(queryset):
+	total = queryset.order_by().values('supply').annotate(total=Sum('quantity')).values('total')
+	return Coalesce(Subquery(total, output_field=IntegerField()), 0)
+
+
+def pending_incoming_units(horizon=None):
+	incoming = IncomingSupply.objects.filter(supply=OuterRef('pk'), status=IncomingSupply.STATUS_PENDING)
+	if horizon is not None:
+		# Only deliveries expected by the horizon; undated ones can't be counted on
+		incoming = incoming.filter(expected_date__lte=horizon)
+	return _subquery_sum(incoming)
+
+
+def pending_demand_units():
+	return _subquery_sum(SupplyRequestItem.objects.filter(
+		supply=OuterRef('pk'), request__status=SupplyRequest.STATUS_PENDING
+	))
+
+
+def with_stock_position(queryset, horizon=None):
+	return queryset.annotate(
+		on_hand=available_units(),
+		incoming_units=pending_incoming_units(horizon),
+		pending_units=pending_demand_units(),
+	).annotate(projected_units=F('on_hand') + F('incoming_units') - F('pending_units'))
+
+
+def with_reorder_suggestion(queryset):
+	# Reorder point: expected demand over the lead time plus the safety stock.
+	# Suggest enough to bring the projected position back up to that point.
+	queryset = with_stock_position(queryset).annotate(
+		daily_rate=Coalesce(F('forecast__daily_rate'), Value(0.0), output_field=FloatField()),
+	).annotate(
+		reorder_point=Cast(
+			Ceil(F('daily_rate') * F('lead_time_days'), output_field=FloatField()), IntegerField()
+		) + F('safety_stock'),
+	).annotate(
+		suggested_units=Greatest(F('reorder_point') - F('projected_units'), Value(0), output_field=IntegerField()),
+	)
+	return queryset.annotate(suggested_boxes=Case(
+		When(unit__in=('pack', 'ream'), then=F('suggested_units')),
+		When(items_per_box__gt=0, then=Cast(
+			Ceil(Cast(F('suggested_units'), FloatField()) / F('items_per_box'), output_field=FloatField()), IntegerField()
+		)),
+		# No box size recorded; order in pieces
+		default=F('suggested_units'),
+		output_field=IntegerField(),
+	))
+
+
+def reorder_report(queryset, only_needed=True):
+	queryset = with_reorder_suggestion(queryset)
+	if only_needed:
+		queryset = queryset.filter(suggested_units__gt=0)
+	return queryset.order_by('-suggested_units', 'name')
+
+
+def projection_stamp(horizon=None):
+	# Changes exactly when projections can: a supply write bumps the catalog, every new or
+	# decided request adds a request event, and every expected delivery adds a row
+	horizon = horizon or default_horizon()
+	latest_incoming = IncomingSupply.objects.aggregate(last=Max('id'))['last'] or 0
+	return f'{get_catalog_version()}:{latest_event_id()}:{latest_incoming}:{horizon}'
+
+
+def get_projection(horizon=None, supply_ids=None):
+	# {'stamp': ..., 'units': {supply_pk: projected units}}, for the given supplies or the whole catalog
+	horizon = horizon or default_horizon()
+	stamp = projection_stamp(horizon)
+	scope = 'all' if supply_ids is None else hashlib.sha1(','.join(map(str, sorted(supply_ids))).encode()).hexdigest()
+	key = f'supplies:projection:{stamp}:{scope}'
+	projection = cache.get(key)
+	if projection is None:
+		supplies = Supply.objects.all() if supply_ids is None else Supply.objects.filter(pk__in=supply_ids)
+		projection = {
+			'stamp': stamp,
+			'units': dict(with_stock_position(supplies, horizon).values_list('pk', 'projected_units')),
+		}
+		cache.set(key, projection, PROJECTION_CACHE_TIMEOUT)
+	return projection
+
+
+def projected_shortfalls(limit=8, horizon=None):
+	horizon = horizon or default_horizon()
+	key = f'supplies:projection:shortfalls:{projection_stamp(horizon)}:{limit}'
+	shortfalls = cache.get(key)
+	if shortfalls is None:
+		shortfalls = list(
+			with_stock_position(Supply.objects.all(), horizon)
+			.filter(projected_units__lt=0)
+			.order_by('projected_units', 'name')[:limit]
+		)
+		cache.set(key, shortfalls, PROJECTION_CACHE_TIMEOUT)
+	return shortfalls
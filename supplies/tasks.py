@@ -0,0 +1,21 @@
+from django.tasks import task
+
+from .checkpoints import create_month_end_checkpoint
+from .forecast import refresh_forecasts
+from .retirement import purge_orphaned_supplies
+
+
+@task(priority=-10)
+def refresh_supply_forecasts():
+	return refresh_forecasts()
+
+
+@task(priority=-10)
+def create_stock_checkpoint():
+	checkpoint, count = create_month_end_checkpoint()
+	return {'as_of': checkpoint.as_of.isoformat(), 'supplies': count}
+
+
+@task(priority=-10)
+def purge_retired_supplies():
+	return purge_orphaned_supplies()
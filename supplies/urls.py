@@ -5,11 +5,26 @@ from . import views
 urlpatterns = [
     path('', views.home, name='home'),
     path('dashboard/', views.dashboard, name='dashboard'),
+    path('dashboard/async/', views.dashboard_async, name='dashboard_async'),
+    path('analytics/outgoing/', views.analytics_outgoing, name='analytics_outgoing'),
+    path('analytics/outgoing/async/', views.analytics_outgoing_async, name='analytics_outgoing_async'),
     path('profile/', views.profile_settings, name='profile_settings'),
     path('list/', views.supply_list, name='supply_list'),
+    path('grid/', views.supply_grid, name='supply_grid'),
+    path('grid/patch/', views.supply_grid_patch, name='supply_grid_patch'),
     path('add/', views.supply_create, name='supply_create'),
     path('<int:pk>/edit/', views.supply_update, name='supply_update'),
-    path('<int:pk>/delete/', views.supply_delete, name='supply_delete'),
+    path('<int:pk>/retire/', views.supply_retire, name='supply_retire'),
+    path('<int:pk>/restore/', views.supply_restore, name='supply_restore'),
+    path('reorder/', views.reorder_report, name='reorder_report'),
+    path('as-of/', views.inventory_as_of, name='inventory_as_of'),
+    path('counts/', views.count_list, name='count_list'),
+    path('counts/<int:pk>/', views.count_detail, name='count_detail'),
+    path('counts/<int:pk>/refresh/', views.count_refresh, name='count_refresh'),
+    path('counts/<int:pk>/apply/', views.count_apply, name='count_apply'),
+    path('scan/', views.scan_station, name='scan_station'),
+    path('scan/lookup/', views.scan_lookup, name='scan_lookup'),
+    path('scan/commit/', views.scan_commit, name='scan_commit'),
     path('incoming/', views.record_incoming, name='record_incoming'),
     path('incoming/<int:pk>/receive/', views.receive_incoming, name='incoming_receive'),
 ]
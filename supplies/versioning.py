@@ -0,0 +1,47 @@
+from django.db.models import F
+
+from .catalog import bump_catalog_version
+from .models import Supply
+
+
+# Fields staff edit by hand on the supply form; stock fields are also moved by
+# deliveries and approvals, so a stale form must never write them back blindly.
+STOCK_FIELDS = ('boxes_count', 'quantity')
+
+
+class StaleSupplyError(Exception):
+	def __init__(self, supply):
+		super().__init__(f'{supply.name} was changed by someone else.')
+		self.supply = supply
+
+
+def save_supply_fields(supply, fields, expected_version=None):
+	# Compare-and-set on the version column: the write only lands if nobody saved
+	# the row since it was read, and only the given columns are written. Retired
+	# supplies still settle their pending deliveries and requests.
+	if expected_version is None:
+		expected_version = supply.version
+	values = {name: getattr(supply, name) for name in fields}
+	updated = update_supplies(Supply.all_objects.filter(pk=supply.pk, version=expected_version), version=F('version') + 1, **values)
+	if not updated:
+		raise StaleSupplyError(supply)
+	supply.version = expected_version + 1
+	return supply
+
+
+# QuerySet.update() and bulk_update() skip post_save, which is what normally bumps
+# the catalog; supply writes that bypass save() go through these two instead.
+def update_supplies(queryset, **values):
+	updated = queryset.update(**values)
+	if updated:
+		bump_catalog_version()
+	return updated
+
+
+def bulk_update_supplies(supplies, fields, batch_size=None):
+	Supply.all_objects.bulk_update(supplies, fields, batch_size=batch_size)
+	bump_catalog_version()
+
+
+def changed_fields(original, updated, fields):
+	return [name for name in fields if getattr(original, name) != getattr(updated, name)]
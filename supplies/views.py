@@ -1,33 +1,91 @@
+import asyncio
+import copy
+import csv
+import json
+from datetime import date
 from functools import wraps
 
+from asgiref.sync import iscoroutinefunction, sync_to_async
+
 from django import forms
 from django.contrib import messages
 from django.contrib.auth import login as auth_login
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import PasswordChangeForm, UserCreationForm
 from django.contrib.auth import update_session_auth_hash
-from django.db.models import Count, Sum, Q
-from django.db.models.functions import TruncMonth
+from django.db import connections, transaction
+from django.db.models import Count, Q
+from django.db.models.functions import Abs
+from django.core.paginator import Paginator
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
 from django.utils import timezone
 from django.contrib.auth import get_user_model
-
-from requisitions.models import SupplyRequest, SupplyRequestItem
-
-from .forms import IncomingSupplyForm, SupplyForm
-from .models import IncomingSupply, Supply
-
-
-LOW_STOCK_THRESHOLD = 2
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+
+from core.idempotency import idempotent
+from requisitions.events import latest_event_id
+
+from .analytics import (
+	GRANULARITIES,
+	GROUPINGS,
+	get_outgoing_series,
+	get_outgoing_summary,
+	low_stock_supplies,
+	no_stock_supplies,
+	parse_analytics_params,
+	pending_requests_count,
+	stock_totals,
+	top_requested,
+)
+from .checkpoints import day_end, last_month_end, stock_as_of
+from .conditional import catalog_etag
+from .counts import StaleCountError, apply_count, count_summary, record_counts, refresh_variances
+from .forecast import order_by_risk, running_out_supplies, with_days_left
+from .forms import CountSessionForm, CountUploadForm, IncomingSupplyForm, SupplyForm
+from .grid import GRID_FIELDS, GridPatchError, apply_patch, parse_patch
+from .models import CountSession, IncomingSupply, Supply
+from .retirement import RestoreConflictError, restore_supply, retire_supply
+from .scanning import SCAN_MODE_ISSUE, SCAN_MODE_RECEIVE, ScanBatchError, issue_batch, lookup_sku, parse_batch, receive_batch, scan_payload
+from .stock import LOW_STOCK_THRESHOLD, available_units, default_horizon, projected_shortfalls, reorder_report as build_reorder_report
+from .versioning import STOCK_FIELDS, StaleSupplyError, changed_fields, save_supply_fields
+
+
+REORDER_PAGE_SIZE = 100
+REORDER_CSV_COLUMNS = (
+	('name', 'Item'),
+	('size_spec', 'Size / Specification'),
+	('category', 'Category'),
+	('unit', 'Unit'),
+	('items_per_box', 'Items / Box'),
+	('on_hand', 'On Hand'),
+	('incoming_units', 'Pending Incoming'),
+	('pending_units', 'Pending Requests'),
+	('projected_units', 'Projected'),
+	('reorder_point', 'Reorder Point'),
+	('suggested_units', 'Suggested Units'),
+	('suggested_boxes', 'Suggested Boxes'),
+)
 
 
 def staff_required(view_func):
-	@wraps(view_func)
-	def _wrapped(request, *args, **kwargs):
-		if not request.user.is_staff:
-			messages.error(request, 'Staff access required.')
-			return redirect('home')
-		return view_func(request, *args, **kwargs)
+	if iscoroutinefunction(view_func):
+		@wraps(view_func)
+		async def _wrapped(request, *args, **kwargs):
+			user = await request.auser()
+			if not user.is_staff:
+				messages.error(request, 'Staff access required.')
+				return redirect('home')
+			return await view_func(request, *args, **kwargs)
+	else:
+		@wraps(view_func)
+		def _wrapped(request, *args, **kwargs):
+			if not request.user.is_staff:
+				messages.error(request, 'Staff access required.')
+				return redirect('home')
+			return view_func(request, *args, **kwargs)
 
 	return login_required(_wrapped)
 
@@ -95,72 +153,374 @@ def profile_settings(request):
 	return render(request, 'registration/profile_settings.html', context)
 
 
+def _dashboard_context(stock, low_stock, no_stock, pending_count, top, running_out, shortfalls):
+	return {
+		'total_supplies': stock['total_supplies'],
+		'total_quantity': stock['total_quantity'],
+		'low_stock': low_stock,
+		'no_stock': no_stock,
+		'low_stock_count': len(low_stock),
+		'no_stock_count': len(no_stock),
+		'low_stock_threshold': LOW_STOCK_THRESHOLD,
+		'top_requested': top,
+		'running_out': running_out,
+		'projected_shortfalls': shortfalls,
+		'projection_horizon': default_horizon(),
+		'analytics_granularities': list(GRANULARITIES),
+		'analytics_groupings': list(GROUPINGS),
+		'pending_requests_count': pending_count,
+	}
+
+
+def _run_isolated(func, *args, **kwargs):
+	try:
+		return func(*args, **kwargs)
+	finally:
+		# Worker threads open their own connection; close it before the thread is reused
+		connections.close_all()
+
+
+def _gather_isolated(*calls):
+	# The async ORM serialises every query on one thread-sensitive executor, so each
+	# aggregate runs in its own worker thread and connection to actually overlap.
+	return asyncio.gather(*(
+		sync_to_async(_run_isolated, thread_sensitive=False)(func, *args)
+		for func, *args in calls
+	))
+
+
 @staff_required
 def dashboard(request):
-	total_supplies = Supply.objects.count()
-	total_quantity = Supply.objects.aggregate(total=Sum('quantity'))['total'] or 0
-	low_stock = Supply.objects.filter(quantity__gt=0, quantity__lte=LOW_STOCK_THRESHOLD).order_by('quantity', 'name')
-	no_stock = Supply.objects.filter(quantity__lte=0).order_by('name')
-	low_stock_count = low_stock.count()
-	no_stock_count = no_stock.count()
-
-	pending_requests_count = SupplyRequest.objects.filter(status=SupplyRequest.STATUS_PENDING, is_archived=False).count()
-
-	top_requested = (
-		SupplyRequestItem.objects.filter(request__status='approved')
-		.values('supply__name')
-		.annotate(total=Sum('quantity'))
-		.order_by('-total')[:5]
+	# Read first, so the live feed replays anything that changes while the page renders
+	last_event_id = latest_event_id()
+	context = _dashboard_context(
+		stock_totals(),
+		low_stock_supplies(LOW_STOCK_THRESHOLD),
+		no_stock_supplies(),
+		pending_requests_count(),
+		top_requested(),
+		running_out_supplies(),
+		projected_shortfalls(),
 	)
+	context['last_request_event_id'] = last_event_id
+	return render(request, 'supplies/dashboard.html', context)
+
 
-	monthly_outgoing = (
-		SupplyRequestItem.objects.filter(request__status='approved')
-		.annotate(month=TruncMonth('request__requested_at'))
-		.values('month')
-		.annotate(total=Sum('quantity'))
-		.order_by('month')
+@staff_required
+async def dashboard_async(request):
+	last_event_id = await sync_to_async(latest_event_id)()
+	results = await _gather_isolated(
+		(stock_totals,),
+		(low_stock_supplies, LOW_STOCK_THRESHOLD),
+		(no_stock_supplies,),
+		(pending_requests_count,),
+		(top_requested,),
+		(running_out_supplies,),
+		(projected_shortfalls,),
 	)
+	# Rendering touches request.user and the session, which stay on the sync thread
+	context = _dashboard_context(*results)
+	context['last_request_event_id'] = last_event_id
+	return await sync_to_async(render)(request, 'supplies/dashboard.html', context)
 
-	chart_labels = [entry['month'].strftime('%b %Y') for entry in monthly_outgoing if entry['month']]
-	chart_values = [entry['total'] for entry in monthly_outgoing]
 
-	context = {
-		'total_supplies': total_supplies,
-		'total_quantity': total_quantity,
-		'low_stock': low_stock,
-		'no_stock': no_stock,
-		'low_stock_count': low_stock_count,
-		'no_stock_count': no_stock_count,
-		'low_stock_threshold': LOW_STOCK_THRESHOLD,
-		'top_requested': top_requested,
-		'chart_labels': chart_labels,
-		'chart_values': chart_values,
-		'pending_requests_count': pending_requests_count,
-	}
-	return render(request, 'supplies/dashboard.html', context)
+@staff_required
+def analytics_outgoing(request):
+	try:
+		params = parse_analytics_params(request.GET)
+	except ValueError as exc:
+		return JsonResponse({'error': str(exc)}, status=400)
+	data = dict(get_outgoing_series(**params))
+	data['summary'] = get_outgoing_summary(params['start'], params['end'])
+	return JsonResponse(data)
+
+
+@staff_required
+async def analytics_outgoing_async(request):
+	try:
+		params = parse_analytics_params(request.GET)
+	except ValueError as exc:
+		return JsonResponse({'error': str(exc)}, status=400)
+	series, summary = await _gather_isolated(
+		(get_outgoing_series, params['start'], params['end'], params['granularity'], params['group_by']),
+		(get_outgoing_summary, params['start'], params['end']),
+	)
+	data = dict(series)
+	data['summary'] = summary
+	return JsonResponse(data)
 
 
 @staff_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=catalog_etag)
 def supply_list(request):
 	selected_category = request.GET.get('category', '').strip()
 	query = request.GET.get('q', '').strip()
-	supplies = Supply.objects.all()
+	show_retired = request.GET.get('status') == 'retired'
+	supplies = Supply.all_objects.filter(is_active=False) if show_retired else Supply.objects.all()
 	if selected_category:
 		supplies = supplies.filter(category__iexact=selected_category)
 	if query:
 		supplies = supplies.filter(Q(name__icontains=query) | Q(description__icontains=query) | Q(size_spec__icontains=query))
-	supplies = supplies.order_by('name')
+	supplies = with_days_left(supplies)
+	sort = request.GET.get('sort', '').strip()
+	supplies = order_by_risk(supplies) if sort == 'risk' else supplies.order_by('name')
 	categories = [choice[0] for choice in Supply.CATEGORY_CHOICES]
 	return render(request, 'supplies/supply_list.html', {
 		'supplies': supplies,
 		'categories': categories,
 		'selected_category': selected_category,
 		'query': query,
+		'sort': sort,
+		'show_retired': show_retired,
 		'low_stock_threshold': LOW_STOCK_THRESHOLD,
 	})
 
 
+GRID_PAGE_SIZE = 100
+
+
+@staff_required
+def supply_grid(request):
+	selected_category = request.GET.get('category', '').strip()
+	query = request.GET.get('q', '').strip()
+	supplies = Supply.objects.only('pk', 'version', 'quantity', *GRID_FIELDS).order_by('name', 'size_spec', 'pk')
+	if selected_category:
+		supplies = supplies.filter(category__iexact=selected_category)
+	if query:
+		supplies = supplies.filter(Q(name__icontains=query) | Q(description__icontains=query) | Q(size_spec__icontains=query))
+	page = Paginator(supplies, GRID_PAGE_SIZE).get_page(request.GET.get('page'))
+	params = request.GET.copy()
+	params.pop('page', None)
+	return render(request, 'supplies/supply_grid.html', {
+		'page': page,
+		'categories': [choice[0] for choice in Supply.CATEGORY_CHOICES],
+		'units': [choice[0] for choice in Supply.UNIT_CHOICES],
+		'selected_category': selected_category,
+		'query': query,
+		'querystring': params.urlencode(),
+	})
+
+
+@staff_required
+def supply_grid_patch(request):
+	if request.method != 'POST':
+		return JsonResponse({'error': 'POST a JSON patch.'}, status=405)
+	try:
+		patch = parse_patch(json.loads(request.body))
+		results = apply_patch(patch)
+	except ValueError:
+		return JsonResponse({'error': 'The request body is not valid JSON.'}, status=400)
+	except GridPatchError as exc:
+		return JsonResponse({'error': str(exc)}, status=400)
+	return JsonResponse({
+		'saved': sum(1 for result in results.values() if result['status'] == 'ok'),
+		'rows': [{'id': supply_id, **result} for supply_id, result in results.items()],
+	})
+
+
+class _Echo:
+	# csv.writer target that hands each row straight to the streaming response
+	def write(self, value):
+		return value
+
+
+def _reorder_csv_rows(queryset):
+	writer = csv.writer(_Echo())
+	yield writer.writerow([label for field, label in REORDER_CSV_COLUMNS])
+	fields = [field for field, label in REORDER_CSV_COLUMNS]
+	for row in queryset.values_list(*fields).iterator(chunk_size=2000):
+		yield writer.writerow(row)
+
+
+@staff_required
+def reorder_report(request):
+	selected_category = request.GET.get('category', '').strip()
+	query = request.GET.get('q', '').strip()
+	show_all = request.GET.get('all') == '1'
+	supplies = Supply.objects.all()
+	if selected_category:
+		supplies = supplies.filter(category__iexact=selected_category)
+	if query:
+		supplies = supplies.filter(Q(name__icontains=query) | Q(description__icontains=query) | Q(size_spec__icontains=query))
+	report = build_reorder_report(supplies, only_needed=not show_all)
+
+	if request.GET.get('format') == 'csv':
+		response = StreamingHttpResponse(_reorder_csv_rows(report), content_type='text/csv')
+		response['Content-Disposition'] = f'attachment; filename="procurement-list-{timezone.localdate():%Y%m%d}.csv"'
+		return response
+
+	page = Paginator(report, REORDER_PAGE_SIZE).get_page(request.GET.get('page'))
+	params = request.GET.copy()
+	params.pop('page', None)
+	params.pop('format', None)
+	return render(request, 'supplies/reorder_report.html', {
+		'page': page,
+		'categories': [choice[0] for choice in Supply.CATEGORY_CHOICES],
+		'selected_category': selected_category,
+		'query': query,
+		'show_all': show_all,
+		'querystring': params.urlencode(),
+	})
+
+
+INVENTORY_AS_OF_PAGE_SIZE = 100
+
+
+def _inventory_csv_rows(supplies, units):
+	writer = csv.writer(_Echo())
+	yield writer.writerow(['Item', 'Size / Specification', 'Category', 'Unit', 'Stock As Of', 'Stock Now'])
+	for supply in supplies.iterator(chunk_size=2000):
+		yield writer.writerow([supply.name, supply.size_spec, supply.category, supply.unit, units.get(supply.pk, 0), supply.on_hand])
+
+
+@staff_required
+def inventory_as_of(request):
+	try:
+		day = date.fromisoformat(request.GET['date']) if request.GET.get('date') else last_month_end()
+	except ValueError:
+		messages.error(request, 'Use YYYY-MM-DD for the date.')
+		return redirect('inventory_as_of')
+	moment = day_end(day)
+	selected_category = request.GET.get('category', '').strip()
+	query = request.GET.get('q', '').strip()
+	supplies = Supply.all_objects.filter(created_at__lt=moment).annotate(on_hand=available_units()).order_by('name', 'size_spec', 'pk')
+	if selected_category:
+		supplies = supplies.filter(category__iexact=selected_category)
+	if query:
+		supplies = supplies.filter(Q(name__icontains=query) | Q(description__icontains=query) | Q(size_spec__icontains=query))
+
+	if request.GET.get('format') == 'csv':
+		filtered = bool(selected_category or query)
+		units, checkpoint = stock_as_of(moment, list(supplies.values_list('pk', flat=True)) if filtered else None)
+		response = StreamingHttpResponse(_inventory_csv_rows(supplies, units), content_type='text/csv')
+		response['Content-Disposition'] = f'attachment; filename="inventory-as-of-{day:%Y%m%d}.csv"'
+		return response
+
+	page = Paginator(supplies, INVENTORY_AS_OF_PAGE_SIZE).get_page(request.GET.get('page'))
+	# Only the supplies on this page are computed
+	units, checkpoint = stock_as_of(moment, [supply.pk for supply in page])
+	for supply in page:
+		supply.units_as_of = units.get(supply.pk, 0)
+	params = request.GET.copy()
+	params.pop('page', None)
+	params.pop('format', None)
+	return render(request, 'supplies/inventory_as_of.html', {
+		'page': page,
+		'day': day,
+		'checkpoint': checkpoint,
+		'categories': [choice[0] for choice in Supply.CATEGORY_CHOICES],
+		'selected_category': selected_category,
+		'query': query,
+		'querystring': params.urlencode(),
+	})
+
+
+COUNT_PAGE_SIZE = 100
+
+
+@staff_required
+def count_list(request):
+	if request.method == 'POST':
+		form = CountSessionForm(request.POST)
+		if form.is_valid():
+			session = form.save(commit=False)
+			session.created_by = request.user
+			session.save()
+			messages.success(request, 'Count started. Download the count sheet, fill in what you find on the shelves, then upload it.')
+			return redirect('count_detail', pk=session.pk)
+	else:
+		form = CountSessionForm()
+	sessions = CountSession.objects.select_related('created_by', 'applied_by').annotate(
+		line_count=Count('lines'),
+		variance_count=Count('lines', filter=~Q(lines__variance=0)),
+	).order_by('-created_at', '-pk')
+	page = Paginator(sessions, COUNT_PAGE_SIZE).get_page(request.GET.get('page'))
+	return render(request, 'supplies/count_list.html', {'form': form, 'page': page})
+
+
+def _count_sheet_rows(session):
+	writer = csv.writer(_Echo())
+	yield writer.writerow(['supply_id', 'Item', 'Size / Specification', 'Category', 'Unit', 'System Units', 'counted'])
+	counted = dict(session.lines.values_list('supply_id', 'counted_units'))
+	supplies = Supply.objects.annotate(on_hand=available_units()).order_by('category', 'name', 'size_spec', 'pk')
+	for supply in supplies.iterator(chunk_size=2000):
+		yield writer.writerow([supply.pk, supply.name, supply.size_spec, supply.category, supply.unit, supply.on_hand, counted.get(supply.pk, '')])
+
+
 @staff_required
+def count_detail(request, pk):
+	session = get_object_or_404(CountSession.objects.select_related('created_by', 'applied_by'), pk=pk)
+	draft = session.status == CountSession.STATUS_DRAFT
+
+	if request.GET.get('format') == 'csv':
+		response = StreamingHttpResponse(_count_sheet_rows(session), content_type='text/csv')
+		response['Content-Disposition'] = f'attachment; filename="count-sheet-{session.pk}.csv"'
+		return response
+
+	if request.method == 'POST' and draft:
+		form = CountUploadForm(request.POST, request.FILES)
+		if form.is_valid():
+			counts = form.cleaned_data['counts']
+			unknown = record_counts(session, counts)
+			messages.success(request, f'{len(counts) - len(unknown)} counts recorded.')
+			if unknown:
+				messages.warning(request, f"Skipped {len(unknown)} unknown supply IDs: {', '.join(map(str, unknown[:20]))}{'…' if len(unknown) > 20 else ''}")
+			return redirect('count_detail', pk=session.pk)
+	else:
+		form = CountUploadForm()
+
+	show_all = request.GET.get('all') == '1'
+	lines = session.lines.select_related('supply').order_by(Abs('variance').desc(), 'supply__name', 'pk')
+	if not show_all:
+		lines = lines.exclude(variance=0)
+	page = Paginator(lines, COUNT_PAGE_SIZE).get_page(request.GET.get('page'))
+	params = request.GET.copy()
+	params.pop('page', None)
+	params.pop('format', None)
+	return render(request, 'supplies/count_detail.html', {
+		'session': session,
+		'draft': draft,
+		'form': form,
+		'summary': count_summary(session),
+		'page': page,
+		'show_all': show_all,
+		'querystring': params.urlencode(),
+	})
+
+
+@staff_required
+def count_refresh(request, pk):
+	session = get_object_or_404(CountSession, pk=pk, status=CountSession.STATUS_DRAFT)
+	if request.method == 'POST':
+		refreshed = refresh_variances(session)
+		messages.success(request, f'Variances recomputed against current stock for {refreshed} counted supplies.')
+	return redirect('count_detail', pk=session.pk)
+
+
+@staff_required
+@idempotent
+def count_apply(request, pk):
+	session = get_object_or_404(CountSession, pk=pk)
+	if request.method != 'POST':
+		return redirect('count_detail', pk=session.pk)
+	if session.status != CountSession.STATUS_DRAFT:
+		messages.info(request, 'This count has already been applied.')
+		return redirect('count_detail', pk=session.pk)
+	try:
+		adjusted = apply_count(session, request.user)
+	except StaleCountError as exc:
+		if not exc.supply_ids:
+			messages.info(request, 'This count has already been applied.')
+		else:
+			messages.error(request, f'{exc} Recompute the variances, review them, and apply again.')
+		return redirect('count_detail', pk=session.pk)
+	messages.success(request, f'Count applied: stock adjusted for {adjusted} supplies.')
+	return redirect('count_detail', pk=session.pk)
+
+
+@staff_required
+@idempotent
 def supply_create(request):
 	if request.method == 'POST':
 		form = SupplyForm(request.POST)
@@ -178,10 +538,32 @@ def supply_create(request):
 	return render(request, 'supplies/supply_form.html', {'form': form, 'title': 'Add Supply'})
 
 
+def _conflict_context(form, current):
+	# form.instance holds the submitted values; current is the row as saved by someone else
+	changes = []
+	merged = {}
+	for name in SupplyForm._meta.fields:
+		theirs = getattr(current, name)
+		yours = getattr(form.instance, name)
+		# Keep the saved stock counts by default: they reflect real deliveries and issues
+		merged[name] = theirs if name in STOCK_FIELDS else yours
+		if theirs != yours:
+			changes.append({'label': form.fields[name].label, 'theirs': theirs, 'yours': yours, 'stock': name in STOCK_FIELDS})
+	merged['version'] = current.version
+	return {
+		'form': SupplyForm(instance=current, initial=merged),
+		'supply': current,
+		'changes': changes,
+		'title': 'Edit Supply',
+	}
+
+
 @staff_required
 def supply_update(request, pk):
 	supply = get_object_or_404(Supply, pk=pk)
 	if request.method == 'POST':
+		# is_valid() copies the posted values onto the instance, so keep the saved row
+		original = copy.copy(supply)
 		form = SupplyForm(request.POST, instance=supply)
 		if form.is_valid():
 			updated = form.save(commit=False)
@@ -189,8 +571,17 @@ def supply_update(request, pk):
 				updated.quantity = updated.boxes_count or 0
 			else:
 				updated.quantity = (updated.boxes_count or 0) * (updated.items_per_box or 0)
-			updated.save()
-			messages.success(request, 'Supply updated.')
+			fields = changed_fields(original, updated, SupplyForm._meta.fields)
+			if 'name' in fields and updated.assign_family():
+				fields.append('family')
+			try:
+				if fields:
+					save_supply_fields(updated, fields, form.cleaned_data['version'] or original.version)
+			except StaleSupplyError:
+				current = get_object_or_404(Supply, pk=pk)
+				messages.warning(request, 'This supply was changed by someone else while you were editing. Review the changes below and save again.')
+				return render(request, 'supplies/supply_conflict.html', _conflict_context(form, current), status=409)
+			messages.success(request, 'Supply updated.' if fields else 'No changes to save.')
 			return redirect('supply_list')
 	else:
 		form = SupplyForm(instance=supply)
@@ -198,13 +589,26 @@ def supply_update(request, pk):
 
 
 @staff_required
-def supply_delete(request, pk):
+def supply_retire(request, pk):
 	supply = get_object_or_404(Supply, pk=pk)
 	if request.method == 'POST':
-		supply.delete()
-		messages.success(request, 'Supply deleted.')
+		retire_supply(supply)
+		messages.success(request, f'{supply.name} retired. It no longer appears in the catalog; its deliveries and requests are kept.')
 		return redirect('supply_list')
-	return render(request, 'supplies/supply_delete.html', {'supply': supply})
+	return render(request, 'supplies/supply_retire.html', {'supply': supply})
+
+
+@staff_required
+def supply_restore(request, pk):
+	supply = get_object_or_404(Supply.all_objects, pk=pk, is_active=False)
+	if request.method == 'POST':
+		try:
+			restore_supply(supply)
+		except RestoreConflictError as exc:
+			messages.error(request, str(exc))
+			return redirect(f"{reverse('supply_list')}?status=retired")
+		messages.success(request, f'{supply.name} is back in the catalog.')
+	return redirect('supply_list')
 
 
 @staff_required
@@ -226,6 +630,7 @@ def record_incoming(request):
 
 
 @staff_required
+@idempotent
 def receive_incoming(request, pk):
 	incoming = get_object_or_404(IncomingSupply.objects.select_related('supply'), pk=pk)
 	if incoming.status == IncomingSupply.STATUS_RECEIVED:
@@ -243,13 +648,70 @@ def receive_incoming(request, pk):
 			delta_boxes = incoming.quantity // supply.items_per_box
 		supply.boxes_count = supply.boxes_count + delta_boxes
 		supply.quantity = supply.quantity + incoming.quantity
-	supply.save()
 
-	incoming.status = IncomingSupply.STATUS_RECEIVED
-	incoming.received_at = timezone.now()
-	incoming.save(update_fields=['status', 'received_at'])
+	try:
+		with transaction.atomic():
+			# Claim the delivery first so a double submit can't add it twice
+			claimed = IncomingSupply.objects.filter(pk=incoming.pk, status=IncomingSupply.STATUS_PENDING).update(
+				status=IncomingSupply.STATUS_RECEIVED, received_at=timezone.now()
+			)
+			if not claimed:
+				messages.info(request, 'This incoming supply is already received.')
+				return redirect('record_incoming')
+			save_supply_fields(supply, STOCK_FIELDS)
+	except StaleSupplyError:
+		messages.error(request, f'Stock for {supply.name} changed while receiving. Please try again.')
+		return redirect('record_incoming')
 
 	messages.success(request, 'Items added to inventory.')
 	return redirect('record_incoming')
 
+
+@staff_required
+def scan_station(request):
+	mode = SCAN_MODE_ISSUE if request.GET.get('mode') == SCAN_MODE_ISSUE else SCAN_MODE_RECEIVE
+	return render(request, 'supplies/scan.html', {'mode': mode})
+
+
+@staff_required
+def scan_lookup(request):
+	supply = lookup_sku(request.GET.get('code'))
+	if supply is None:
+		return JsonResponse({'error': 'No supply has this SKU or barcode.'}, status=404)
+	return JsonResponse(scan_payload(supply))
+
+
+@staff_required
+@idempotent
+def scan_commit(request):
+	if request.method != 'POST':
+		return redirect('scan_station')
+	mode = request.POST.get('mode')
+	scan_url = f"{reverse('scan_station')}?mode={mode}" if mode == SCAN_MODE_ISSUE else reverse('scan_station')
+	department = request.POST.get('department', '').strip()
+	try:
+		batch = parse_batch(request.POST.get('lines'))
+		if mode == SCAN_MODE_ISSUE:
+			if not department:
+				raise ScanBatchError('Enter the department the items are issued to.')
+			supply_request = issue_batch(
+				batch, request.user, department, request.POST.get('requester_name', '').strip(), request.POST.get('notes', '').strip()
+			)
+		elif mode == SCAN_MODE_RECEIVE:
+			received = receive_batch(batch, request.POST.get('notes', '').strip())
+		else:
+			raise ScanBatchError('Choose whether the batch is received or issued.')
+	except ScanBatchError as exc:
+		messages.error(request, str(exc))
+		return redirect(scan_url)
+	except StaleSupplyError as exc:
+		messages.error(request, f'Stock for {exc.supply.name} changed while committing. Nothing was saved; please commit the batch again.')
+		return redirect(scan_url)
+
+	if mode == SCAN_MODE_ISSUE:
+		messages.success(request, f'Issued {len(batch)} item(s) as approved request #{supply_request.pk}.')
+		return redirect('request_detail', pk=supply_request.pk)
+	messages.success(request, f'Received {received} item(s) into inventory.')
+	return redirect(scan_url)
+
 # Create your views here.